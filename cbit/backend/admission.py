@@ -0,0 +1,215 @@
+# -------------------------
+# Admission Control + Fair Scheduling for the Whisper backend
+# -------------------------
+# Every upload is probed for its duration and turned into an estimated compute
+# cost (seconds of Whisper time). The controller:
+#   - rejects work beyond a per-node budget (caller answers 429 + Retry-After)
+#   - keeps part of that budget for short clips, and caps how much of it one
+#     long job can hold, so a long upload never locks short clips out
+#   - runs at most MAX_CONCURRENT_JOBS jobs at once; with more than one slot
+#     (one model instance each) the last slot is kept free for short clips
+#   - picks the next job by per-client fair share (least cost served so far),
+#     then shortest estimated cost
+
+import itertools
+import math
+import subprocess
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def probe_duration(media_path):
+    """Media duration in seconds via ffprobe (reads only the container header)"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        media_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFprobe error: {result.stderr}")
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        raise Exception(f"Could not read media duration: {result.stdout.strip()!r}")
+
+
+class Ticket:
+    def __init__(self, job_id, client_id, cost, ready=True):
+        self.job_id = job_id
+        self.client_id = client_id
+        self.cost = cost
+        self.ready = ready      # Not-ready tickets hold budget but are never dispatched
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent_jobs=1, work_budget=1800.0,
+                 short_job_cost=60.0, short_job_reserve=300.0,
+                 realtime_factor=0.5, overhead=2.0):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.work_budget = work_budget          # Max estimated seconds of work queued + running
+        self.short_job_cost = short_job_cost    # Jobs at or below this may use the reserved slot/budget
+        self.short_job_reserve = short_job_reserve  # Part of work_budget only short jobs may use
+        self.realtime_factor = realtime_factor  # Whisper seconds per media second (learned)
+        self.overhead = overhead                # Fixed per-job cost (model warmup, ffmpeg, ...)
+
+        self.lock = threading.Condition()
+        self.ids = itertools.count(1)
+        self.waiting = []
+        self.running = {}
+        self.served = {}   # client_id -> estimated cost served so far (fair-share clock)
+
+    # -------------------------
+    # Cost estimate
+    # -------------------------
+    def estimate_cost(self, media_seconds):
+        return self.overhead + media_seconds * self.realtime_factor
+
+    def observe(self, ticket, media_seconds, elapsed):
+        """Feed back the real run time so the realtime factor tracks this node"""
+        if media_seconds <= 0:
+            return
+        measured = max(0.0, elapsed - self.overhead) / media_seconds
+        with self.lock:
+            self.realtime_factor = 0.8 * self.realtime_factor + 0.2 * measured
+
+    # -------------------------
+    # Admission
+    # -------------------------
+    def _charge(self, remaining):
+        # One long job holds at most the non-reserved part of the budget
+        return min(remaining, self.work_budget - self.short_job_reserve)
+
+    def _projection(self, now):
+        """Estimated (ticket, start, finish) for every job, running ones first"""
+        slots = sorted(
+            max(now, t.started_at + t.cost) for t in self.running.values())
+        slots += [now] * (self.max_concurrent_jobs - len(slots))
+        plan = [(t, t.started_at, max(now, t.started_at + t.cost)) for t in self.running.values()]
+        for t in sorted(self.waiting, key=lambda t: (t.cost, t.job_id)):
+            start = slots.pop(0)
+            plan.append((t, start, start + t.cost))
+            slots = sorted(slots + [start + t.cost])
+        return plan
+
+    def _outstanding_at(self, plan, when):
+        total = 0.0
+        for _, start, finish in plan:
+            remaining = finish - max(when, start)
+            total += self._charge(max(0.0, remaining))
+        return total
+
+    def outstanding(self):
+        now = time.time()
+        return self._outstanding_at(self._projection(now), now)
+
+    def admit(self, client_id, cost, ready=True):
+        """
+        Queue a job or raise AdmissionRejected if the node budget is used up.
+        With ready=False the budget is reserved now but the job is only
+        scheduled after mark_ready(), e.g. while a preliminary step runs.
+        """
+        with self.lock:
+            now = time.time()
+            plan = self._projection(now)
+            outstanding = self._outstanding_at(plan, now)
+            charge = self._charge(cost)
+            limit = self.work_budget
+            if cost > self.short_job_cost:
+                limit -= self.short_job_reserve
+            # A single job larger than the budget is still let in on an idle node
+            if outstanding > 0 and outstanding + charge > limit:
+                raise AdmissionRejected(
+                    f"Server busy: {outstanding:.0f}s of work already queued",
+                    self._retry_after(plan, now, charge, limit))
+
+            # A client coming back after being idle starts level with the
+            # least-served active client instead of cashing in old credit
+            active = [self.served[t.client_id] for t in self.waiting + list(self.running.values())]
+            floor = min(active) if active else 0.0
+            self.served[client_id] = max(self.served.get(client_id, 0.0), floor)
+
+            ticket = Ticket(next(self.ids), client_id, cost, ready)
+            self.waiting.append(ticket)
+            return ticket
+
+    def mark_ready(self, ticket):
+        with self.lock:
+            ticket.ready = True
+            self._dispatch()
+
+    def _retry_after(self, plan, now, charge, limit):
+        """Seconds until the projected outstanding work leaves room for this job"""
+        horizon = max(finish for _, _, finish in plan) - now
+        lo, hi = 0.0, horizon
+        while hi - lo > 1.0:
+            mid = (lo + hi) / 2
+            if self._outstanding_at(plan, now + mid) + charge <= limit:
+                hi = mid
+            else:
+                lo = mid
+        return max(1, math.ceil(hi))
+
+    # -------------------------
+    # Scheduling
+    # -------------------------
+    def _can_start(self, ticket):
+        if len(self.running) >= self.max_concurrent_jobs:
+            return False
+        if ticket.cost <= self.short_job_cost or self.max_concurrent_jobs == 1:
+            return True
+        # Long jobs leave the last slot free for short clips
+        long_running = sum(1 for t in self.running.values() if t.cost > self.short_job_cost)
+        return long_running < self.max_concurrent_jobs - 1
+
+    def _next_ticket(self):
+        candidates = [t for t in self.waiting if t.ready and self._can_start(t)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: (self.served[t.client_id], t.cost, t.job_id))
+
+    def _dispatch(self):
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            self.waiting.remove(ticket)
+            self.running[ticket.job_id] = ticket
+            self.served[ticket.client_id] += ticket.cost
+            ticket.granted = True
+            ticket.started_at = time.time()
+        self.lock.notify_all()
+
+    def wait(self, ticket):
+        """Block the request thread until the scheduler starts this job"""
+        with self.lock:
+            self._dispatch()
+            while not ticket.granted:
+                self.lock.wait()
+
+    def release(self, ticket):
+        with self.lock:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+            self.running.pop(ticket.job_id, None)
+            self._dispatch()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "running": len(self.running),
+                "waiting": len(self.waiting),
+                "outstanding_seconds": round(self.outstanding(), 1),
+                "work_budget_seconds": self.work_budget,
+                "realtime_factor": round(self.realtime_factor, 3),
+            }
@@ -5,11 +5,23 @@
 from flask import Flask, request, send_file, jsonify
 from flask_cors import CORS
 import os
+import json
+import uuid
+import shutil
 import subprocess
 import tempfile
+import threading
+import time
 from datetime import timedelta
+import numpy as np
 import whisper
+from whisper.tokenizer import LANGUAGES
 from werkzeug.utils import secure_filename
+from streaming_transcribe import spool_output_args, transcribe_streaming
+from multi_track_transcribe import DEFAULT_TRACKS, transcribe_tracks, tracks_cost_factor
+from speculative_decoding import SpeculativeWhisper
+from recaption_diff import changed_region, splice_segments
+from admission import AdmissionController, AdmissionRejected, probe_duration
 
 # -------------------------
 # Flask App
@@ -19,10 +31,42 @@ CORS(app)  # Enable CORS for frontend connection
 
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
+ASSET_FOLDER = "assets"  # Decoded audio (FLAC) + segment list per asset, for /recaption
+ASSET_TTL = 24 * 3600   # Assets not used for this long are deleted
 ALLOWED_VIDEO_EXTENSIONS = {'mp4','avi', 'mov', 'mkv', 'webm', 'flv', 'wmv'}
 
+# Admission control limits
+MAX_UPLOAD_MB = 2048
+MAX_MEDIA_SECONDS = 3 * 3600
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Per-node work budget, in estimated seconds of Whisper time (queued + running)
+admission = AdmissionController(
+    # One Whisper model instance, and its KV cache hooks are not safe to share
+    # between concurrent decodes, so jobs run one at a time
+    max_concurrent_jobs=1,
+    work_budget=1800.0,
+    short_job_cost=60.0,
+    short_job_reserve=300.0,  # Budget a long upload can never take from short clips
+    realtime_factor=0.5,  # Starting guess for "small" on CPU, refined from real runs
+)
+# The progressive-captions draft pass runs on its own (tiny) model instance, so
+# it gets its own queue: one draft at a time, sized for the tiny model's speed
+draft_admission = AdmissionController(
+    max_concurrent_jobs=1,
+    work_budget=600.0,
+    short_job_cost=60.0,
+    short_job_reserve=120.0,
+    realtime_factor=0.05,
+)
+# Proxies allowed to name the end client with X-Client-Id (comma-separated IPs)
+TRUSTED_PROXIES = {ip.strip() for ip in os.environ.get('TRUSTED_PROXIES', '').split(',') if ip.strip()}
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(ASSET_FOLDER, exist_ok=True)
+
+SAMPLE_RATE = 16000
 
 # -------------------------
 # Utilities
@@ -30,13 +74,19 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
-def run_ffmpeg_extract_audio(video_path, out_audio_path):
+def run_ffmpeg_extract_audio(video_path, out_audio_path, codec="pcm_s16le", spool_path=None):
+    """
+    Extract 16 kHz mono audio for Whisper. With spool_path the same ffmpeg run
+    also copies the video/audio packets there for merge_subtitles, so the
+    upload is only read once.
+    """
     print(f"  🔊 Extracting audio from video...")
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_path,
+    cmd = ["ffmpeg", "-y", "-i", video_path]
+    if spool_path:
+        cmd += spool_output_args(spool_path)
+    cmd += [
         "-vn",
-        "-acodec", "pcm_s16le",
+        "-acodec", codec,
         "-ar", "16000",
         "-ac", "1",
         out_audio_path
@@ -46,6 +96,35 @@ def run_ffmpeg_extract_audio(video_path, out_audio_path):
         raise Exception(f"FFmpeg error: {result.stderr}")
     print(f"  ✅ Audio extracted successfully")
 
+# Matroska wants ISO 639-2 codes; Whisper reports ISO 639-1
+ISO639_2 = {
+    'en': 'eng', 'hi': 'hin', 'te': 'tel', 'ta': 'tam', 'ml': 'mal', 'kn': 'kan',
+    'mr': 'mar', 'bn': 'ben', 'gu': 'guj', 'pa': 'pan', 'ur': 'urd', 'es': 'spa',
+    'fr': 'fra', 'de': 'deu', 'ja': 'jpn', 'zh': 'zho', 'ar': 'ara', 'ru': 'rus'
+}
+
+def merge_subtitles(video_path, subtitle_tracks, output_path):
+    """
+    Copy video/audio and add every SRT in subtitle_tracks as a soft subtitle stream.
+    subtitle_tracks: list of (srt_path, language_code, title)
+    """
+    cmd = ["ffmpeg", "-y", "-i", video_path]
+    for srt_path, _, _ in subtitle_tracks:
+        cmd += ["-i", srt_path]
+    cmd += ["-map", "0:v?", "-map", "0:a?"]
+    for i in range(len(subtitle_tracks)):
+        cmd += ["-map", f"{i + 1}:0"]
+    cmd += ["-c:v", "copy", "-c:a", "copy", "-c:s", "srt"]
+    for i, (_, language, title) in enumerate(subtitle_tracks):
+        cmd += [f"-metadata:s:s:{i}", f"language={ISO639_2.get(language, language)}"]
+        if title:
+            cmd += [f"-metadata:s:s:{i}", f"title={title}"]
+    cmd.append(output_path)
+
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg merge error: {result.stderr}")
+
 def srt_timestamp(seconds_float):
     td = timedelta(seconds=seconds_float)
     total_seconds = int(td.total_seconds())
@@ -64,6 +143,163 @@ def write_srt(segments):
         srt_text += f"{i}\n{start_ts} --> {end_ts}\n{text}\n\n"
     return srt_text
 
+def apply_style(srt_content, style):
+    if style == 'meme':
+        srt_content = srt_content.replace(".", " 😄")
+        print(f"  🎭 Applied meme style")
+    elif style == 'aesthetic':
+        srt_content = srt_content.replace(".", " ✨")
+        print(f"  ✨ Applied aesthetic style")
+    return srt_content
+
+def clean_segments(whisper_segments, offset=0.0):
+    segments = []
+    for seg in whisper_segments:
+        segments.append({
+            "start": float(seg["start"]) + offset,
+            "end": float(seg["end"]) + offset,
+            "text": seg["text"].strip()
+        })
+    return segments
+
+# -------------------------
+# Admission control helpers
+# -------------------------
+def client_id():
+    """Fair-share key: the peer address, or X-Client-Id when it comes from a trusted proxy"""
+    if request.remote_addr in TRUSTED_PROXIES and request.headers.get('X-Client-Id'):
+        return request.headers['X-Client-Id']
+    return request.remote_addr
+
+def admit_job(media_seconds):
+    """Reserve budget for media_seconds of audio and block until the scheduler starts the job"""
+    cost = admission.estimate_cost(media_seconds)
+    ticket = admission.admit(client_id(), cost)
+    print(f"  🚦 Queued job #{ticket.job_id} ({media_seconds:.1f}s media, ~{cost:.0f}s work) "
+          f"- {admission.snapshot()}")
+    admission.wait(ticket)
+    waited = ticket.started_at - ticket.enqueued_at
+    print(f"  🚦 Job #{ticket.job_id} started after {waited:.1f}s in queue")
+    return ticket
+
+def requested_tracks():
+    """Tracks for dual-output mode, or None when it is off"""
+    if request.form.get('dual', 'false').lower() != 'true':
+        return None
+    extra = [code.strip().lower() for code in request.form.get('extra_languages', '').split(',') if code.strip()]
+    return DEFAULT_TRACKS + [
+        {"name": f"forced_{code}", "task": "transcribe", "language": code}
+        for code in extra
+    ]
+
+def unsupported_languages(tracks):
+    return [t["language"] for t in tracks or [] if t["language"] and t["language"] not in LANGUAGES]
+
+def unsupported_languages_response(codes):
+    return jsonify({"error": f"Unsupported language code(s): {', '.join(codes)}"}), 400
+
+def track_outputs(tracks, result):
+    """Per-track SRT + segments for the response"""
+    outputs = {}
+    for track in tracks:
+        segments = clean_segments(result["tracks"][track["name"]])
+        language = "en" if track["task"] == "translate" else (track["language"] or result["language"])
+        outputs[track["name"]] = {
+            "language": language,
+            "captions": write_srt(segments),
+            "segments": segments
+        }
+    return outputs
+
+def busy_response(e):
+    print(f"  🚦 Rejected: {e} (Retry-After: {e.retry_after}s)")
+    print("=" * 60 + "\n")
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def too_long_response(media_seconds):
+    return jsonify({
+        "error": f"Media is {media_seconds / 60:.1f} minutes long; the limit is {MAX_MEDIA_SECONDS / 60:.0f} minutes"
+    }), 413
+
+# -------------------------
+# Asset store (for incremental re-captioning)
+# -------------------------
+# One lock per asset: edits of the same asset (recaption, progressive
+# refinement) read-modify-write its audio and segments, so they take turns
+asset_locks = {}
+asset_locks_lock = threading.Lock()
+
+def asset_lock(asset_id):
+    with asset_locks_lock:
+        return asset_locks.setdefault(asset_id, threading.Lock())
+
+def expire_assets():
+    cutoff = time.time() - ASSET_TTL
+    for name in os.listdir(ASSET_FOLDER):
+        asset_dir = os.path.join(ASSET_FOLDER, name)
+        try:
+            if os.path.getmtime(asset_dir) < cutoff:
+                shutil.rmtree(asset_dir, ignore_errors=True)
+                with asset_locks_lock:
+                    asset_locks.pop(name, None)
+        except OSError:
+            pass  # Removed by a concurrent request
+
+def new_asset_dir():
+    expire_assets()
+    asset_id = uuid.uuid4().hex
+    asset_dir = os.path.join(ASSET_FOLDER, asset_id)
+    os.makedirs(asset_dir)
+    return asset_id, asset_dir
+
+def asset_dir_for(asset_id):
+    asset_dir = os.path.join(ASSET_FOLDER, secure_filename(asset_id))
+    if not asset_id or not os.path.isdir(asset_dir):
+        return None
+    os.utime(asset_dir)  # Last use, for expire_assets
+    return asset_dir
+
+def save_asset_meta(asset_dir, segments, task, language):
+    meta = {"task": task, "language": language, "segments": segments}
+    with open(os.path.join(asset_dir, "segments.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+def load_asset_meta(asset_dir):
+    with open(os.path.join(asset_dir, "segments.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def align_to_keys(draft_segments, refined_segments):
+    """
+    Re-cut the refined transcript onto the draft's segment timings, so each
+    draft segment (key) gets the refined words spoken inside it. Uses word
+    timestamps when present, whole refined segments otherwise.
+    """
+    if not draft_segments:
+        return [dict(seg, key=i) for i, seg in enumerate(refined_segments)]
+
+    pieces = []
+    for seg in refined_segments:
+        for word in seg.get("words") or [{"start": seg["start"], "end": seg["end"], "word": " " + seg["text"]}]:
+            pieces.append(word)
+
+    texts = [[] for _ in draft_segments]
+    for word in pieces:
+        mid = (word["start"] + word["end"]) / 2
+        # Segment containing the word's midpoint, else the nearest one
+        best = min(
+            range(len(draft_segments)),
+            key=lambda i: max(draft_segments[i]["start"] - mid, mid - draft_segments[i]["end"], 0.0)
+        )
+        texts[best].append(word["word"])
+
+    return [
+        {"key": seg["key"], "start": seg["start"], "end": seg["end"], "text": "".join(words).strip()}
+        for seg, words in zip(draft_segments, texts)
+        if "".join(words).strip()
+    ]
+
 # -------------------------
 # Whisper model load (load once)
 # -------------------------
@@ -74,15 +310,93 @@ model = whisper.load_model("small")
 print("✅ Whisper model loaded successfully!")
 print("=" * 60)
 
+# Draft models, loaded on first use. Progressive drafts run whisper's own
+# transcribe(), which installs kv-cache hooks on the model, so they get their own
+# instance (one at a time through draft_admission) and never share one with the
+# hook-free caches of SpeculativeWhisper
+DRAFT_MODEL_NAME = "tiny"
+draft_models = {}
+draft_model_lock = threading.Lock()
+
+def get_draft_model(purpose):
+    """The draft model instance for "speculative" or "progressive" use"""
+    with draft_model_lock:
+        if purpose not in draft_models:
+            print(f"🚀 Loading {purpose} draft Whisper model ({DRAFT_MODEL_NAME})...")
+            draft_models[purpose] = whisper.load_model(DRAFT_MODEL_NAME, device=model.device)
+        return draft_models[purpose]
+
+def whisper_for_request():
+    """The shared model, wrapped for speculative decoding when the request opts in"""
+    if request.form.get('speculative', 'false').lower() == 'true':
+        return SpeculativeWhisper(model, get_draft_model("speculative"))
+    return model
+
+# Progressive jobs: fast draft first, refined result published later
+PROGRESSIVE_JOB_TTL = 3600
+progressive_jobs = {}
+progressive_jobs_lock = threading.Lock()
+
+def update_progressive_job(job_id, **fields):
+    with progressive_jobs_lock:
+        progressive_jobs[job_id].update(fields, updated_at=time.time())
+
+def expire_progressive_jobs():
+    cutoff = time.time() - PROGRESSIVE_JOB_TTL
+    with progressive_jobs_lock:
+        for job_id in [j for j, job in progressive_jobs.items() if job["updated_at"] < cutoff]:
+            del progressive_jobs[job_id]
+
+def refine_progressive_job(job_id, ticket, audio_path, asset_dir, task, style, draft_segments, media_seconds):
+    """Background thread: full-model pass, re-cut onto the draft timings"""
+    try:
+        admission.mark_ready(ticket)
+        admission.wait(ticket)
+        update_progressive_job(job_id, status="refining")
+        print(f"  🔁 Refining job {job_id} with the main Whisper model...")
+        start = time.time()
+        result = model.transcribe(audio_path, task=task, word_timestamps=True)
+        admission.observe(ticket, media_seconds, time.time() - start)
+
+        segments = align_to_keys(draft_segments, result['segments'])
+        detected_lang = result.get('language', 'unknown')
+        draft = [{k: s[k] for k in ("start", "end", "text")} for s in draft_segments]
+        with asset_lock(os.path.basename(asset_dir)):
+            if load_asset_meta(asset_dir)["segments"] == draft:
+                # Skipped if /recaption already edited the draft asset
+                save_asset_meta(asset_dir, [{k: s[k] for k in ("start", "end", "text")} for s in segments],
+                                task, detected_lang)
+        update_progressive_job(
+            job_id,
+            status="final",
+            segments=segments,
+            captions=apply_style(write_srt(segments), style),
+            language_detected=detected_lang
+        )
+        print(f"  ✅ Job {job_id} refined: {len(segments)} segments")
+    except Exception as e:
+        print(f"  ❌ Refinement failed for job {job_id}: {str(e)}")
+        update_progressive_job(job_id, status="failed", error=str(e))
+    finally:
+        admission.release(ticket)
+
 # -------------------------
 # Flask Routes
 # -------------------------
+@app.before_request
+def limit_upload_size():
+    # Answer oversized uploads before any of the body is read
+    if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({"error": f"Upload too large (limit {MAX_UPLOAD_MB} MB)"}), 413
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for frontend"""
     return jsonify({
         "status": "healthy",
-        "message": "Caption generator backend is running"
+        "message": "Caption generator backend is running",
+        "load": admission.snapshot(),
+        "draft_load": draft_admission.snapshot()
     })
 
 @app.route('/')
@@ -93,7 +407,10 @@ def index():
             "/health": "GET - Health check",
             "/generate-captions": "POST - Generate captions only",
             "/generate-video-with-captions": "POST - Generate video with embedded captions",
-            "/download/<filename>": "GET - Download generated video"
+            "/download/<filename>": "GET - Download generated video",
+            "/recaption/<asset_id>": "POST - Re-caption only an edited time range",
+            "/generate-captions-progressive": "POST - Fast draft captions now, refined captions later",
+            "/progressive/<job_id>": "GET - Poll a progressive job for refined captions"
         }
     })
 
@@ -101,6 +418,8 @@ def index():
 def generate_captions():
     """Generate captions from video - returns JSON with SRT content"""
     video_path = None
+    asset_dir = None
+    ticket = None
     
     try:
         print("\n" + "=" * 60)
@@ -121,6 +440,14 @@ def generate_captions():
         # Get options
         task = request.form.get('task', 'translate')  # Default to translate for better results
         style = request.form.get('style', 'formal')
+        # Bounded-memory windowed transcription, for long media
+        streaming = request.form.get('streaming', 'false').lower() == 'true'
+        # Original-language + English (+ forced-language) tracks from one encoder pass
+        tracks = requested_tracks()
+        if unsupported_languages(tracks):
+            return unsupported_languages_response(unsupported_languages(tracks))
+        # Draft-and-verify decoding; same transcript, fewer main-model decoder passes
+        whisper_model = whisper_for_request()
         
         # Force translate to get English captions from non-English audio
         if task == 'transcribe':
@@ -136,14 +463,34 @@ def generate_captions():
         video_size = os.path.getsize(video_path)
         print(f"📹 Video uploaded: {filename}")
         print(f"📊 Video file size: {video_size / (1024*1024):.2f} MB")
-        print(f"⚙️  Task: {task}, Style: {style}")
+        print(f"⚙️  Task: {task}, Style: {style}, Streaming: {streaming}, "
+              f"Tracks: {[t['name'] for t in tracks] if tracks else 'single'}")
 
-        # Create temp directory
-        with tempfile.TemporaryDirectory() as tmpdir:
-            audio_path = os.path.join(tmpdir, "audio.wav")
+        # Admission control: size the job before doing any real work
+        media_seconds = probe_duration(video_path)
+        if media_seconds > MAX_MEDIA_SECONDS:
+            os.remove(video_path)
+            return too_long_response(media_seconds)
+        # Dual jobs are sized (and observed) as extra media seconds of single-track work
+        work_seconds = media_seconds * (tracks_cost_factor(tracks) if tracks else 1)
+        ticket = admit_job(work_seconds)
+
+        # Keep the decoded audio (FLAC) so /recaption can re-use it later
+        asset_id, asset_dir = new_asset_dir()
+        audio_path = os.path.join(asset_dir, "audio.flac")
 
+        if tracks:
+            # One mel + encoder pass per window, one decoder run per track
+            print(f"  🤖 Transcribing {len(tracks)} tracks with a shared encoder pass...")
+            result = transcribe_tracks(model, video_path, tracks, save_audio_path=audio_path)
+            result["segments"] = result["tracks"]["english"]
+        elif streaming:
+            # Audio is decoded window by window; the FLAC copy is written by the same ffmpeg run
+            print(f"  🤖 Streaming through Whisper model (task: {task})...")
+            result = transcribe_streaming(whisper_model, video_path, task=task, save_audio_path=audio_path)
+        else:
             # Extract audio
-            run_ffmpeg_extract_audio(video_path, audio_path)
+            run_ffmpeg_extract_audio(video_path, audio_path, codec="flac")
             
             # Check audio file
             audio_size = os.path.getsize(audio_path)
@@ -154,83 +501,90 @@ def generate_captions():
             print(f"  🎵 Audio file: {audio_path}")
             
             # Add verbose output to see what Whisper is doing
-            result = model.transcribe(audio_path, task=task, verbose=True)
-            
-            detected_lang = result.get('language', 'unknown')
-            print(f"  🌍 Language detected: {detected_lang}")
-            
-            # DEBUG: Print what Whisper actually detected
-            print(f"\n  🔍 DEBUG: Whisper returned {len(result.get('segments', []))} segments")
-            if len(result.get('segments', [])) > 0:
-                print(f"  🔍 DEBUG: First 3 segments from Whisper:")
-                for i, seg in enumerate(result.get('segments', [])[:3]):
-                    print(f"     [{i+1}] {seg['start']:.2f}s - {seg['end']:.2f}s: '{seg['text'].strip()}'")
-            else:
-                print(f"  ⚠️  WARNING: No segments detected!")
-            print()
+            result = whisper_model.transcribe(audio_path, task=task, verbose=True)
+        admission.observe(ticket, work_seconds, time.time() - ticket.started_at)
+        
+        detected_lang = result.get('language', 'unknown')
+        print(f"  🌍 Language detected: {detected_lang}")
+        
+        # DEBUG: Print what Whisper actually detected
+        print(f"\n  🔍 DEBUG: Whisper returned {len(result.get('segments', []))} segments")
+        if len(result.get('segments', [])) > 0:
+            print(f"  🔍 DEBUG: First 3 segments from Whisper:")
+            for i, seg in enumerate(result.get('segments', [])[:3]):
+                print(f"     [{i+1}] {seg['start']:.2f}s - {seg['end']:.2f}s: '{seg['text'].strip()}'")
+        else:
+            print(f"  ⚠️  WARNING: No segments detected!")
+        print()
 
-            # Process segments
-            segments = []
-            for seg in result['segments']:
-                segments.append({
-                    "start": float(seg["start"]),
-                    "end": float(seg["end"]),
-                    "text": seg["text"].strip()
-                })
-            
-            print(f"  📝 Generated {len(segments)} caption segments")
+        # Process segments
+        segments = clean_segments(result['segments'])
+        save_asset_meta(asset_dir, segments, task, detected_lang)
+        
+        print(f"  📝 Generated {len(segments)} caption segments")
 
-            # Generate SRT
-            srt_content = write_srt(segments)
-            
-            # Apply style
-            if style == 'meme':
-                srt_content = srt_content.replace(".", " 😄")
-                print(f"  🎭 Applied meme style")
-            elif style == 'aesthetic':
-                srt_content = srt_content.replace(".", " ✨")
-                print(f"  ✨ Applied aesthetic style")
-            
-            # Print first few captions
-            print("\n" + "-" * 60)
-            print("📋 GENERATED CAPTIONS (preview):")
-            print("-" * 60)
-            lines = srt_content.split('\n')
-            preview_lines = lines[:min(15, len(lines))]
-            print('\n'.join(preview_lines))
-            if len(lines) > 15:
-                print(f"\n... ({len(lines) - 15} more lines)")
-            print("-" * 60)
+        # Generate SRT
+        srt_content = write_srt(segments)
+        
+        # Apply style
+        srt_content = apply_style(srt_content, style)
+        
+        # Print first few captions
+        print("\n" + "-" * 60)
+        print("📋 GENERATED CAPTIONS (preview):")
+        print("-" * 60)
+        lines = srt_content.split('\n')
+        preview_lines = lines[:min(15, len(lines))]
+        print('\n'.join(preview_lines))
+        if len(lines) > 15:
+            print(f"\n... ({len(lines) - 15} more lines)")
+        print("-" * 60)
 
-            # Cleanup
-            os.remove(video_path)
+        # Cleanup
+        os.remove(video_path)
 
-            response = {
-                "success": True,
-                "captions": srt_content,
-                "segments": segments,
-                "language_detected": detected_lang,
-                "message": f"Captions generated successfully using {task} mode"
-            }
-            
-            print(f"✅ Response ready: {len(srt_content)} characters")
-            print("=" * 60 + "\n")
-            
-            return jsonify(response)
+        response = {
+            "success": True,
+            "captions": srt_content,
+            "segments": segments,
+            "language_detected": detected_lang,
+            "asset_id": asset_id,
+            "message": f"Captions generated successfully using {task} mode"
+        }
+        if tracks:
+            response["tracks"] = track_outputs(tracks, result)
+        if isinstance(whisper_model, SpeculativeWhisper):
+            response["speculative"] = whisper_model.summary()
+            print(f"  ⚡ Speculative decoding: {response['speculative']}")
+        
+        print(f"✅ Response ready: {len(srt_content)} characters")
+        print("=" * 60 + "\n")
+        
+        return jsonify(response)
 
     except Exception as e:
         if video_path and os.path.exists(video_path):
             os.remove(video_path)
+        if asset_dir:
+            shutil.rmtree(asset_dir, ignore_errors=True)
+        if isinstance(e, AdmissionRejected):
+            return busy_response(e)
         
         print(f"❌ ERROR: {str(e)}")
         print("=" * 60 + "\n")
         return jsonify({"error": f"Failed to generate captions: {str(e)}"}), 500
 
+    finally:
+        if ticket:
+            admission.release(ticket)
+
 @app.route('/generate-video-with-captions', methods=['POST'])
 def generate_video_with_captions():
     """Generate video with embedded captions - returns downloadable video"""
     video_path = None
     output_path = None
+    asset_dir = None
+    ticket = None
     
     try:
         print("\n" + "=" * 60)
@@ -250,26 +604,59 @@ def generate_video_with_captions():
         
         # Get task option
         task = request.form.get('task', 'translate')
+        streaming = request.form.get('streaming', 'false').lower() == 'true'
+        tracks = requested_tracks()
+        if unsupported_languages(tracks):
+            return unsupported_languages_response(unsupported_languages(tracks))
+        if tracks:
+            task = 'translate'  # The English track is the primary one
+        whisper_model = whisper_for_request()
         
         filename = secure_filename(video_file.filename)
         video_path = os.path.join(UPLOAD_FOLDER, filename)
         video_file.save(video_path)
         
         print(f"📹 Video uploaded: {filename}")
-        print(f"⚙️  Task: {task}")
+        print(f"⚙️  Task: {task}, Streaming: {streaming}, "
+              f"Tracks: {[t['name'] for t in tracks] if tracks else 'single'}")
+
+        # Admission control: size the job before doing any real work
+        media_seconds = probe_duration(video_path)
+        if media_seconds > MAX_MEDIA_SECONDS:
+            os.remove(video_path)
+            return too_long_response(media_seconds)
+        # Dual jobs are sized (and observed) as extra media seconds of single-track work
+        work_seconds = media_seconds * (tracks_cost_factor(tracks) if tracks else 1)
+        ticket = admit_job(work_seconds)
 
         # Create temp directory
+        asset_id, asset_dir = new_asset_dir()
         with tempfile.TemporaryDirectory() as tmpdir:
-            audio_path = os.path.join(tmpdir, "audio.wav")
+            audio_path = os.path.join(asset_dir, "audio.flac")
             srt_path = os.path.join(tmpdir, "captions.srt")
+            # Copied video/audio packets from the same ffmpeg read as the audio
+            # extraction; the subtitle merge reads this instead of the upload
+            spool_path = os.path.join(tmpdir, "spool.mkv")
 
-            # Extract audio
-            run_ffmpeg_extract_audio(video_path, audio_path)
+            if tracks:
+                print(f"  🤖 Transcribing {len(tracks)} tracks with a shared encoder pass...")
+                result = transcribe_tracks(model, video_path, tracks, save_audio_path=audio_path,
+                                           spool_path=spool_path)
+                result["segments"] = result["tracks"]["english"]
+            elif streaming:
+                print(f"  🤖 Streaming through Whisper model (task: {task})...")
+                result = transcribe_streaming(whisper_model, video_path, task=task, save_audio_path=audio_path,
+                                              spool_path=spool_path)
+            else:
+                # Extract audio (kept as FLAC so /recaption can re-use it later)
+                run_ffmpeg_extract_audio(video_path, audio_path, codec="flac", spool_path=spool_path)
 
-            # Transcribe with Whisper
-            print(f"  🤖 Processing with Whisper model (task: {task})...")
-            print(f"  🎵 Audio file: {audio_path}")
-            result = model.transcribe(audio_path, task=task)
+                # Transcribe with Whisper
+                print(f"  🤖 Processing with Whisper model (task: {task})...")
+                print(f"  🎵 Audio file: {audio_path}")
+                result = whisper_model.transcribe(audio_path, task=task)
+            admission.observe(ticket, work_seconds, time.time() - ticket.started_at)
+            os.remove(video_path)  # Fully read; everything below works from the spool
             detected_lang = result.get('language', 'unknown')
             print(f"  🌍 Language detected: {detected_lang}")
             
@@ -284,13 +671,8 @@ def generate_video_with_captions():
             print()
 
             # Process segments
-            segments = []
-            for seg in result['segments']:
-                segments.append({
-                    "start": float(seg["start"]),
-                    "end": float(seg["end"]),
-                    "text": seg["text"].strip()
-                })
+            segments = clean_segments(result['segments'])
+            save_asset_meta(asset_dir, segments, task, detected_lang)
             
             print(f"  📝 Generated {len(segments)} caption segments")
 
@@ -315,26 +697,24 @@ def generate_video_with_captions():
             output_filename = f"{name_without_ext}_with_captions.mkv"
             output_path = os.path.join(OUTPUT_FOLDER, output_filename)
             
-            print(f"  🎥 Merging video with subtitles...")
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", video_path,
-                "-i", srt_path,
-                "-c:v", "copy",
-                "-c:a", "copy",
-                "-c:s", "srt",
-                "-metadata:s:s:0", "language=eng",
-                output_path
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg merge error: {result.stderr}")
+            subtitle_tracks = [(srt_path, "en", None)]
+            outputs = None
+            if tracks:
+                # Every track goes into the same merge, English first
+                outputs = track_outputs(tracks, result)
+                subtitle_tracks = []
+                for name, output in outputs.items():
+                    track_srt = os.path.join(tmpdir, f"captions_{name}.srt")
+                    with open(track_srt, "w", encoding="utf-8") as f:
+                        f.write(output["captions"])
+                    subtitle_tracks.append((track_srt, output["language"], name))
+                subtitle_tracks.sort(key=lambda t: t[2] != "english")
+
+            print(f"  🎥 Merging video with {len(subtitle_tracks)} subtitle track(s)...")
+            merge_subtitles(spool_path, subtitle_tracks, output_path)
             
             print(f"  ✅ Video with subtitles created: {output_filename}")
 
-            # Cleanup
-            os.remove(video_path)
-
             response = {
                 "success": True,
                 "output_filename": output_filename,
@@ -342,8 +722,14 @@ def generate_video_with_captions():
                 "captions": srt_content,
                 "segments": segments,
                 "language_detected": detected_lang,
+                "asset_id": asset_id,
                 "message": "Video with captions generated successfully"
             }
+            if outputs:
+                response["tracks"] = outputs
+            if isinstance(whisper_model, SpeculativeWhisper):
+                response["speculative"] = whisper_model.summary()
+                print(f"  ⚡ Speculative decoding: {response['speculative']}")
             
             print(f"✅ Response ready with download URL")
             print("=" * 60 + "\n")
@@ -355,11 +741,285 @@ def generate_video_with_captions():
             os.remove(video_path)
         if output_path and os.path.exists(output_path):
             os.remove(output_path)
+        if asset_dir:
+            shutil.rmtree(asset_dir, ignore_errors=True)
+        if isinstance(e, AdmissionRejected):
+            return busy_response(e)
         
         print(f"❌ ERROR: {str(e)}")
         print("=" * 60 + "\n")
         return jsonify({"error": f"Failed to generate video: {str(e)}"}), 500
 
+    finally:
+        if ticket:
+            admission.release(ticket)
+
+
+@app.route('/recaption/<asset_id>', methods=['POST'])
+def recaption(asset_id):
+    """
+    Re-caption only part of an earlier result.
+    Either pass `start`/`end` (seconds) to redo that time range from the stored
+    audio, or upload the edited `video` to redo only the range whose audio changed.
+    """
+    video_path = None
+    new_audio_path = None
+    ticket = None
+    lock = None
+    
+    try:
+        print("\n" + "=" * 60)
+        print(f"📥 NEW REQUEST: /recaption/{asset_id}")
+        print("=" * 60)
+
+        asset_dir = asset_dir_for(asset_id)
+        if not asset_dir:
+            return jsonify({"error": "Unknown asset_id"}), 404
+        # Edits of one asset build on each other's audio and segments, so one at a time
+        lock = asset_lock(os.path.basename(asset_dir))
+        lock.acquire()
+
+        meta = load_asset_meta(asset_dir)
+        old_segments = meta["segments"]
+        task = meta["task"]
+        audio_path = os.path.join(asset_dir, "audio.flac")
+        params = request.get_json(silent=True) or request.form
+        style = params.get('style', 'formal')
+
+        old_audio = whisper.load_audio(audio_path)
+        video_file = request.files.get('video')
+
+        if video_file and video_file.filename:
+            # Edited video: find the changed range by diffing against the stored audio
+            if not allowed_file(video_file.filename):
+                return jsonify({"error": "Invalid file type"}), 400
+
+            video_path = os.path.join(UPLOAD_FOLDER, f"recaption_{uuid.uuid4().hex}_{secure_filename(video_file.filename)}")
+            video_file.save(video_path)
+            fd, new_audio_path = tempfile.mkstemp(prefix="audio_new_", suffix=".flac", dir=asset_dir)
+            os.close(fd)
+            run_ffmpeg_extract_audio(video_path, new_audio_path, codec="flac")
+            new_audio = whisper.load_audio(new_audio_path)
+
+            prefix_end, old_suffix_start, new_suffix_start = changed_region(old_audio, new_audio)
+            print(f"  🔍 Audio changed between {prefix_end:.2f}s and {new_suffix_start:.2f}s "
+                  f"(was {old_suffix_start:.2f}s)")
+        else:
+            # Explicit time range on the stored audio
+            try:
+                start = float(params.get('start', 0))
+                end = float(params.get('end', len(old_audio) / SAMPLE_RATE))
+            except (TypeError, ValueError):
+                return jsonify({"error": "start and end must be numbers (seconds)"}), 400
+            if end <= start:
+                return jsonify({"error": "end must be greater than start"}), 400
+
+            new_audio = old_audio
+            prefix_end, old_suffix_start, new_suffix_start = start, end, end
+
+        new_duration = len(new_audio) / SAMPLE_RATE
+        kept_before, kept_after, lo, hi = splice_segments(
+            old_segments, prefix_end, old_suffix_start, new_suffix_start, new_duration)
+
+        changed = old_suffix_start > prefix_end or new_suffix_start > prefix_end
+        new_segments = []
+        if changed and hi > lo:
+            # Only the edited range (widened to whole caption boundaries) goes through Whisper
+            print(f"  🤖 Re-transcribing {lo:.2f}s - {hi:.2f}s of {new_duration:.2f}s (task: {task})...")
+            ticket = admit_job(hi - lo)
+            clip = new_audio[int(lo * SAMPLE_RATE):int(hi * SAMPLE_RATE)]
+            result = model.transcribe(clip, task=task)
+            admission.observe(ticket, hi - lo, time.time() - ticket.started_at)
+            new_segments = [
+                dict(seg, end=min(seg["end"], hi))
+                for seg in clean_segments(result['segments'], offset=lo)
+                if seg["start"] < hi
+            ]
+        else:
+            print(f"  ✅ No audio changes detected")
+
+        segments = kept_before + new_segments + kept_after
+        print(f"  📝 Kept {len(kept_before) + len(kept_after)} segments, replaced "
+              f"{len(old_segments) - len(kept_before) - len(kept_after)} with {len(new_segments)}")
+
+        # Edited audio becomes the new baseline for the next edit
+        if new_audio_path:
+            os.replace(new_audio_path, audio_path)
+            new_audio_path = None
+        save_asset_meta(asset_dir, segments, task, meta["language"])
+
+        # Generate SRT (numbering is rebuilt from the spliced list)
+        srt_content = apply_style(write_srt(segments), style)
+
+        if video_path:
+            os.remove(video_path)
+
+        print(f"✅ Response ready: {len(srt_content)} characters")
+        print("=" * 60 + "\n")
+
+        return jsonify({
+            "success": True,
+            "captions": srt_content,
+            "segments": segments,
+            "language_detected": meta["language"],
+            "asset_id": asset_id,
+            "retranscribed_range": [lo, hi] if new_segments else None,
+            "message": "Captions updated for the edited range"
+        })
+
+    except Exception as e:
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
+        if new_audio_path and os.path.exists(new_audio_path):
+            os.remove(new_audio_path)
+        if isinstance(e, AdmissionRejected):
+            return busy_response(e)
+        
+        print(f"❌ ERROR: {str(e)}")
+        print("=" * 60 + "\n")
+        return jsonify({"error": f"Failed to re-caption: {str(e)}"}), 500
+
+    finally:
+        if ticket:
+            admission.release(ticket)
+        if lock:
+            lock.release()
+
+
+@app.route('/generate-captions-progressive', methods=['POST'])
+def generate_captions_progressive():
+    """
+    Return draft captions from the fast draft model right away, then refine the
+    same job with the main model in the background. Poll /progressive/<job_id>;
+    the refined segments keep the draft's keys and timings.
+    """
+    video_path = None
+    asset_dir = None
+    ticket = None
+    draft_ticket = None
+    refining = False
+    
+    try:
+        print("\n" + "=" * 60)
+        print("📥 NEW REQUEST: /generate-captions-progressive")
+        print("=" * 60)
+
+        if 'video' not in request.files:
+            return jsonify({"error": "No video file uploaded"}), 400
+
+        video_file = request.files['video']
+        if video_file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        
+        if not allowed_file(video_file.filename):
+            return jsonify({"error": "Invalid file type"}), 400
+
+        task = request.form.get('task', 'translate')
+        if task == 'transcribe':
+            task = 'translate'  # Same English-captions rule as /generate-captions
+        style = request.form.get('style', 'formal')
+
+        job_id = uuid.uuid4().hex
+        filename = secure_filename(video_file.filename)
+        video_path = os.path.join(UPLOAD_FOLDER, f"{job_id}_{filename}")
+        video_file.save(video_path)
+        print(f"📹 Video uploaded: {filename}")
+
+        # Reserve budget for the refinement now so we never promise one we can't run;
+        # it is only scheduled once the draft is out, so it can't hold the slot idle
+        media_seconds = probe_duration(video_path)
+        if media_seconds > MAX_MEDIA_SECONDS:
+            os.remove(video_path)
+            return too_long_response(media_seconds)
+        ticket = admission.admit(client_id(), admission.estimate_cost(media_seconds), ready=False)
+        draft_ticket = draft_admission.admit(client_id(), draft_admission.estimate_cost(media_seconds))
+
+        asset_id, asset_dir = new_asset_dir()
+        audio_path = os.path.join(asset_dir, "audio.flac")
+        run_ffmpeg_extract_audio(video_path, audio_path, codec="flac")
+        os.remove(video_path)  # Both passes work from the extracted audio
+
+        # Draft pass with the small/fast model, queued on the draft model's own slot
+        draft_admission.wait(draft_ticket)
+        print(f"  ⚡ Draft pass with Whisper {DRAFT_MODEL_NAME}...")
+        start = time.time()
+        result = get_draft_model("progressive").transcribe(audio_path, task=task)
+        elapsed = time.time() - start
+        draft_admission.observe(draft_ticket, media_seconds, elapsed)
+        draft_admission.release(draft_ticket)
+        draft_ticket = None
+        segments = clean_segments(result['segments'])
+        draft_segments = [dict(seg, key=i) for i, seg in enumerate(segments)]
+        detected_lang = result.get('language', 'unknown')
+        print(f"  ⚡ Draft ready in {elapsed:.1f}s: {len(draft_segments)} segments")
+        # /recaption works on the draft until the refinement replaces it
+        save_asset_meta(asset_dir, segments, task, detected_lang)
+        draft_captions = apply_style(write_srt(draft_segments), style)
+
+        expire_progressive_jobs()
+        with progressive_jobs_lock:
+            progressive_jobs[job_id] = {
+                "status": "draft",
+                "segments": draft_segments,
+                "captions": draft_captions,
+                "language_detected": detected_lang,
+                "asset_id": asset_id,
+                "updated_at": time.time()
+            }
+
+        threading.Thread(
+            target=refine_progressive_job,
+            args=(job_id, ticket, audio_path, asset_dir, task, style, draft_segments, media_seconds),
+            daemon=True
+        ).start()
+        refining = True
+
+        print(f"✅ Draft response ready, refinement queued (job {job_id})")
+        print("=" * 60 + "\n")
+
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "draft",
+            "captions": draft_captions,
+            "segments": draft_segments,
+            "language_detected": detected_lang,
+            "asset_id": asset_id,
+            "poll_url": f"/progressive/{job_id}",
+            "message": "Draft captions ready; refined captions will follow"
+        })
+
+    except Exception as e:
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
+        if asset_dir:
+            shutil.rmtree(asset_dir, ignore_errors=True)
+        if isinstance(e, AdmissionRejected):
+            return busy_response(e)
+        
+        print(f"❌ ERROR: {str(e)}")
+        print("=" * 60 + "\n")
+        return jsonify({"error": f"Failed to generate captions: {str(e)}"}), 500
+
+    finally:
+        if draft_ticket:
+            draft_admission.release(draft_ticket)
+        # The refinement thread owns the ticket once it has started
+        if ticket and not refining:
+            admission.release(ticket)
+
+
+@app.route('/progressive/<job_id>', methods=['GET'])
+def progressive_status(job_id):
+    """Current captions of a progressive job: status is draft, refining, final or failed"""
+    with progressive_jobs_lock:
+        job = progressive_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job_id"}), 404
+        job = dict(job)
+    job.pop("updated_at", None)
+    return jsonify({"success": job["status"] != "failed", "job_id": job_id, **job})
+
 
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Batch Whisper Caption Generator
+Non-interactive version of test_whisper_direct.py for backfilling whole
+directories of videos. Work is pipelined across three stages:
+
+    decode (ffmpeg, thread pool) -> transcribe (Whisper, process pool) -> mux (ffmpeg, thread pool)
+
+so the next file's audio is decoded while the current one is being transcribed.
+Each worker process loads the Whisper model once. Progress is appended to a
+JSONL manifest in the output directory, so an interrupted run picks up where it
+stopped.
+
+Usage:
+    python batch_captions.py /path/to/videos --output-dir outputs/batch --workers 2
+    python batch_captions.py videos.txt --task transcribe --no-mkv
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from test_whisper_direct import write_srt, merge_video_with_subtitles
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv'}
+SAMPLE_RATE = 16000
+PROGRESS_FILE = "batch_progress.jsonl"
+# A file in flight during this many worker crashes (e.g. OOM) is recorded as failed
+MAX_WORKER_CRASHES = 2
+
+# -------------------------
+# Input discovery and progress manifest
+# -------------------------
+def collect_inputs(source, recursive=True):
+    """Return absolute video paths from a directory or a text manifest (one path per line)"""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+            if not recursive:
+                break
+    else:
+        with open(source, encoding="utf-8") as f:
+            paths = [line.strip().strip('"') for line in f]
+        paths = [p for p in paths if p and not p.startswith("#")]
+    return sorted(os.path.abspath(p) for p in paths)
+
+def load_progress(progress_path):
+    """Latest status per input path from a previous run"""
+    status = {}
+    if os.path.exists(progress_path):
+        with open(progress_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line from a crash
+                status[entry["input"]] = entry
+    return status
+
+def output_stem(video_path, input_root, output_dir):
+    """Mirror the input layout under output_dir so equal names in different folders don't collide"""
+    rel = os.path.relpath(video_path, input_root)
+    return os.path.join(output_dir, os.path.splitext(rel)[0])
+
+# -------------------------
+# Stage 1: decode (runs in a thread, ffmpeg does the work)
+# -------------------------
+def decode_audio(video_path, pcm_path):
+    """Decode to raw 16 kHz mono s16le so workers can load it without another ffmpeg call"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-y",
+        "-i", video_path,
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-ac", "1",
+        pcm_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg error: {result.stderr}")
+    return os.path.getsize(pcm_path) / (2 * SAMPLE_RATE)
+
+# -------------------------
+# Stage 2: transcribe (runs in worker processes)
+# -------------------------
+_worker_model = None
+
+def init_worker(model_name, torch_threads):
+    """Load the Whisper model once per worker process"""
+    global _worker_model
+    import torch
+    import whisper
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    _worker_model = whisper.load_model(model_name)
+    print(f"✓ Worker {os.getpid()} loaded Whisper model ({model_name})")
+
+def transcribe_pcm(pcm_path, task, language):
+    import numpy as np
+
+    audio = np.fromfile(pcm_path, dtype=np.int16).astype(np.float32) / 32768.0
+    result = _worker_model.transcribe(audio, task=task, language=language)
+    segments = [
+        {
+            "start": float(seg["start"]),
+            "end": float(seg["end"]),
+            "text": seg["text"].strip()
+        }
+        for seg in result['segments']
+    ]
+    return segments, result.get('language', 'unknown')
+
+# -------------------------
+# Stage 3: write outputs (runs in a thread)
+# -------------------------
+def write_outputs(video_path, stem, segments, make_mkv):
+    os.makedirs(os.path.dirname(stem), exist_ok=True)
+    srt_file = f"{stem}_captions.srt"
+    with open(srt_file, "w", encoding="utf-8") as f:
+        f.write(write_srt(segments))
+
+    output_video = None
+    if make_mkv:
+        output_video = f"{stem}_with_captions.mkv"
+        merge_video_with_subtitles(video_path, srt_file, output_video)
+    return srt_file, output_video
+
+# -------------------------
+# Pipeline driver
+# -------------------------
+class BatchRunner:
+    def __init__(self, args, videos, input_root, progress_path):
+        self.args = args
+        self.videos = videos
+        self.input_root = input_root
+        self.progress_path = progress_path
+        self.scratch = tempfile.mkdtemp(prefix="batch_captions_")
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        # Per-file bookkeeping: video -> {"pcm", "audio_seconds", "language", "t0"}
+        self.jobs = {}
+
+    def record(self, video_path, status, **extra):
+        entry = {"input": video_path, "status": status, "finished_at": time.time(), **extra}
+        with open(self.progress_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        if status == "done":
+            self.done += 1
+            self.audio_seconds += extra.get("audio_seconds", 0.0)
+            print(f"✅ [{self.done + self.failed}/{len(self.videos)}] {os.path.basename(video_path)} "
+                  f"({extra.get('audio_seconds', 0):.0f}s audio, {extra.get('language')})")
+        else:
+            self.failed += 1
+            print(f"❌ [{self.done + self.failed}/{len(self.videos)}] {os.path.basename(video_path)}: "
+                  f"{extra.get('error')}")
+
+    def cleanup_pcm(self, video_path):
+        pcm = self.jobs.get(video_path, {}).get("pcm")
+        if pcm and os.path.exists(pcm):
+            os.remove(pcm)
+
+    def run(self):
+        args = self.args
+        pending = {}   # future -> (stage, video_path)
+        queue = list(self.videos)
+        decoded_waiting = 0  # Decoded (or decoding) files not yet handed to a worker
+        # Keep a few decoded files ready per worker, but cap it so scratch space stays bounded
+        max_prefetch = args.workers + args.prefetch
+
+        def new_infer_pool():
+            return ProcessPoolExecutor(
+                max_workers=args.workers,
+                initializer=init_worker,
+                initargs=(args.model, args.threads_per_worker),
+            )
+
+        decode_pool = ThreadPoolExecutor(max_workers=args.decode_threads)
+        mux_pool = ThreadPoolExecutor(max_workers=args.decode_threads)
+        infer_pool = new_infer_pool()
+
+        def replace_infer_pool(broken_pool):
+            """A dead worker breaks the whole pool; start a fresh one (once per crash)"""
+            nonlocal infer_pool
+            if infer_pool is broken_pool:
+                print("⚠️  Whisper worker died - restarting the worker pool")
+                infer_pool.shutdown(wait=False)
+                infer_pool = new_infer_pool()
+
+        def submit_infer(video):
+            job = self.jobs[video]
+            try:
+                future = infer_pool.submit(transcribe_pcm, job["pcm"], args.task, args.language)
+            except BrokenProcessPool:
+                replace_infer_pool(infer_pool)
+                future = infer_pool.submit(transcribe_pcm, job["pcm"], args.task, args.language)
+            job["pool"] = infer_pool
+            pending[future] = ("infer", video)
+
+        def worker_crashed(video):
+            """Retry files caught in a worker crash; only a repeat offender is recorded as failed"""
+            nonlocal decoded_waiting
+            job = self.jobs[video]
+            replace_infer_pool(job["pool"])
+            job["crashes"] = job.get("crashes", 0) + 1
+            if job["crashes"] < MAX_WORKER_CRASHES:
+                decoded_waiting += 1
+                submit_infer(video)
+                return
+            self.cleanup_pcm(video)
+            self.record(video, "failed", stage="infer",
+                        error=f"Whisper worker crashed {job['crashes']} times (out of memory?)")
+
+        def submit_decodes():
+            nonlocal decoded_waiting
+            while queue and decoded_waiting < max_prefetch:
+                video = queue.pop(0)
+                pcm = os.path.join(self.scratch, f"{len(self.jobs)}.pcm")
+                self.jobs[video] = {"pcm": pcm, "t0": time.time()}
+                pending[decode_pool.submit(decode_audio, video, pcm)] = ("decode", video)
+                decoded_waiting += 1
+
+        try:
+            submit_decodes()
+            while pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, video = pending.pop(future)
+                    job = self.jobs[video]
+                    try:
+                        if stage == "decode":
+                            job["audio_seconds"] = future.result()
+                            submit_infer(video)
+                        elif stage == "infer":
+                            decoded_waiting -= 1
+                            try:
+                                segments, job["language"] = future.result()
+                            except BrokenProcessPool:
+                                worker_crashed(video)
+                                continue
+                            self.cleanup_pcm(video)
+                            stem = output_stem(video, self.input_root, args.output_dir)
+                            pending[mux_pool.submit(write_outputs, video, stem, segments, not args.no_mkv)] = ("mux", video)
+                        else:
+                            srt_file, output_video = future.result()
+                            self.record(
+                                video, "done",
+                                srt=srt_file,
+                                mkv=output_video,
+                                language=job.get("language"),
+                                audio_seconds=job.get("audio_seconds", 0.0),
+                                elapsed=time.time() - job["t0"],
+                            )
+                    except Exception as e:
+                        if stage == "decode":
+                            decoded_waiting -= 1
+                        self.cleanup_pcm(video)
+                        self.record(video, "failed", stage=stage, error=str(e))
+                submit_decodes()
+        finally:
+            decode_pool.shutdown(cancel_futures=True)
+            infer_pool.shutdown(cancel_futures=True)
+            mux_pool.shutdown()
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+# -------------------------
+# Main
+# -------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Caption every video in a directory or manifest")
+    parser.add_argument("source", help="Directory of videos, or a text file with one video path per line")
+    parser.add_argument("--output-dir", default=os.path.join("outputs", "batch"))
+    parser.add_argument("--model", default="small", help="Whisper model name (tiny, base, small, ...)")
+    parser.add_argument("--task", default="translate", choices=["transcribe", "translate"])
+    parser.add_argument("--language", default=None, help="Source language code (default: auto-detect)")
+    parser.add_argument("--workers", type=int, default=1, help="Whisper worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch threads per worker (default: CPU count / workers)")
+    parser.add_argument("--decode-threads", type=int, default=2, help="Concurrent ffmpeg decode/mux jobs")
+    parser.add_argument("--prefetch", type=int, default=2, help="Extra files decoded ahead of the workers")
+    parser.add_argument("--no-mkv", action="store_true", help="Only write SRT files")
+    parser.add_argument("--no-recursive", action="store_true", help="Don't descend into subdirectories")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run files that failed last time")
+    args = parser.parse_args()
+
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+
+    print("🚀 WHISPER CAPTION GENERATOR - BATCH MODE")
+    print("=" * 60)
+
+    videos = collect_inputs(args.source, recursive=not args.no_recursive)
+    if not videos:
+        print(f"❌ No videos found in {args.source}")
+        return 1
+
+    input_root = args.source if os.path.isdir(args.source) else os.path.commonpath(
+        [os.path.dirname(v) for v in videos])
+    os.makedirs(args.output_dir, exist_ok=True)
+    progress_path = os.path.join(args.output_dir, PROGRESS_FILE)
+    previous = load_progress(progress_path)
+
+    skip = {"done", "failed"} if not args.retry_failed else {"done"}
+    todo = [v for v in videos if previous.get(v, {}).get("status") not in skip]
+
+    print(f"📁 Found {len(videos)} videos, {len(videos) - len(todo)} already processed")
+    print(f"🤖 Model: {args.model}, Task: {args.task}, Workers: {args.workers} "
+          f"x {args.threads_per_worker} threads")
+    print(f"📝 Progress manifest: {progress_path}")
+    print("-" * 60)
+    if not todo:
+        print("✅ Nothing to do")
+        return 0
+
+    start = time.time()
+    runner = BatchRunner(args, todo, os.path.abspath(input_root), progress_path)
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted - re-run the same command to resume")
+    elapsed = time.time() - start
+
+    print("\n" + "=" * 60)
+    print("📊 BATCH SUMMARY")
+    print("=" * 60)
+    print(f"   Completed: {runner.done}, Failed: {runner.failed}, Wall time: {elapsed:.1f}s")
+    if elapsed > 0 and runner.done:
+        print(f"   Throughput: {runner.done / elapsed * 3600:.1f} files/hour, "
+              f"{runner.audio_seconds / elapsed:.1f}x real-time "
+              f"({runner.audio_seconds / 3600:.2f}h of audio)")
+    print("=" * 60)
+    return 0 if runner.failed == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
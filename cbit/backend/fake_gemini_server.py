@@ -0,0 +1,129 @@
+# -------------------------
+# Fake Gemini Server - local stand-in for load testing
+# -------------------------
+# Run this, then start gemini_app.py with GEMINI_STUB_URL=http://127.0.0.1:5099
+# so every upload / file poll / generate call hits this server instead of the
+# real Gemini API. Latencies and failures are configurable from the command line.
+
+import argparse
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+# Filled in from the command line in __main__
+CONFIG = {
+    "upload_latency": 0.2,
+    "generate_latency": 1.5,
+    "jitter": 0.3,
+    "processing_polls": 1,
+    "error_rate": 0.0,
+}
+
+# name -> number of polls left before the file turns ACTIVE
+FILES = {}
+FILES_LOCK = threading.Lock()
+
+FAKE_CAPTION = """Option 1: When the load test hits harder than Monday morning
+Option 2: Just vibing at p99
+Option 3: Me pretending this is the real Gemini API
+Option 4: 429 reasons to smile"""
+
+# -------------------------
+# Utilities
+# -------------------------
+def simulated_delay(base):
+    """Sleep for base seconds +/- jitter (as a fraction of base)"""
+    jitter = CONFIG["jitter"]
+    delay = base * random.uniform(1 - jitter, 1 + jitter)
+    if delay > 0:
+        time.sleep(delay)
+
+def maybe_fail():
+    """Return an error response for a configurable fraction of requests"""
+    if random.random() < CONFIG["error_rate"]:
+        return jsonify({"error": "Simulated Gemini failure"}), 503
+    return None
+
+# -------------------------
+# Flask Routes
+# -------------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({"status": "healthy", "message": "Fake Gemini server is running", "config": CONFIG})
+
+@app.route('/upload', methods=['POST'])
+def upload():
+    simulated_delay(CONFIG["upload_latency"])
+    failure = maybe_fail()
+    if failure:
+        return failure
+
+    # Read (and drop) the body so the transfer cost is still paid
+    request.get_data()
+    name = f"files/{uuid.uuid4().hex[:12]}"
+    polls = CONFIG["processing_polls"]
+    with FILES_LOCK:
+        FILES[name] = polls
+    return jsonify({"name": name, "state": "PROCESSING" if polls > 0 else "ACTIVE"})
+
+@app.route('/files/<file_id>', methods=['GET'])
+def get_file(file_id):
+    name = f"files/{file_id}"
+    with FILES_LOCK:
+        if name not in FILES:
+            return jsonify({"error": "File not found"}), 404
+        FILES[name] = max(0, FILES[name] - 1)
+        state = "PROCESSING" if FILES[name] > 0 else "ACTIVE"
+    return jsonify({"name": name, "state": state})
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    simulated_delay(CONFIG["generate_latency"])
+    failure = maybe_fail()
+    if failure:
+        return failure
+
+    payload = request.get_json(silent=True) or {}
+    with FILES_LOCK:
+        FILES.pop(payload.get("file"), None)
+    return jsonify({"text": FAKE_CAPTION})
+
+# -------------------------
+# Run Server
+# -------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--upload-latency", type=float, default=CONFIG["upload_latency"],
+                        help="Seconds spent on each file upload")
+    parser.add_argument("--generate-latency", type=float, default=CONFIG["generate_latency"],
+                        help="Seconds spent on each generate call")
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"],
+                        help="Random +/- fraction applied to every latency")
+    parser.add_argument("--processing-polls", type=int, default=CONFIG["processing_polls"],
+                        help="How many get_file polls return PROCESSING before ACTIVE")
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"],
+                        help="Fraction of upload/generate calls that fail with 503")
+    args = parser.parse_args()
+
+    CONFIG.update({
+        "upload_latency": args.upload_latency,
+        "generate_latency": args.generate_latency,
+        "jitter": args.jitter,
+        "processing_polls": args.processing_polls,
+        "error_rate": args.error_rate,
+    })
+
+    print("\n" + "=" * 60)
+    print("🧪 FAKE GEMINI SERVER")
+    print("=" * 60)
+    print(f"📡 Server starting on http://127.0.0.1:{args.port}")
+    print(f"⚙️  Config: {CONFIG}")
+    print("=" * 60 + "\n")
+
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
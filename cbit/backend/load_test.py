@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Concurrent Load Test for the Caption Generator backends
+Replays a weighted mix of requests against app.py (port 5000) and gemini_app.py
+(port 5001) at a target arrival rate and reports latency percentiles, error
+rates and server-side CPU / memory use.
+
+Typical run (fake Gemini so no API quota is burned):
+    python fake_gemini_server.py --generate-latency 2
+    GEMINI_STUB_URL=http://127.0.0.1:5099 python gemini_app.py
+    python app.py
+    python load_test.py --video sample.mp4 --image sample.jpg --rate 2 --duration 120 \\
+        --mix captions=3,video=1,download=4,gemini=2 --server-pid 1234 --server-pid 5678
+"""
+
+import argparse
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ENDPOINTS = ("captions", "video", "download", "gemini")
+
+# -------------------------
+# Utilities
+# -------------------------
+def parse_mix(mix_str):
+    """Parse 'captions=3,video=1' into {'captions': 3.0, 'video': 1.0}"""
+    mix = {}
+    for part in mix_str.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix:
+        raise ValueError("Request mix is empty")
+    return mix
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+# -------------------------
+# Request senders
+# -------------------------
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.counter = itertools.count(1)
+        self.results = []
+        self.results_lock = threading.Lock()
+        # Outputs produced by /generate-video-with-captions, reused by /download
+        self.download_names = []
+        if args.download_file:
+            self.download_names.append(args.download_file)
+
+    def unique_name(self, path):
+        # app.py stores uploads under their original name, so give every
+        # request its own name to stop concurrent uploads clobbering each other
+        base = os.path.basename(path)
+        return f"loadtest_{next(self.counter)}_{base}"
+
+    def send_captions(self, session):
+        with open(self.args.video, "rb") as f:
+            return session.post(
+                f"{self.args.whisper_url}/generate-captions",
+                files={"video": (self.unique_name(self.args.video), f)},
+                data={"task": self.args.task, "style": "formal"},
+                timeout=self.args.timeout,
+            )
+
+    def send_video(self, session):
+        with open(self.args.video, "rb") as f:
+            response = session.post(
+                f"{self.args.whisper_url}/generate-video-with-captions",
+                files={"video": (self.unique_name(self.args.video), f)},
+                data={"task": self.args.task},
+                timeout=self.args.timeout,
+            )
+        if response.ok:
+            name = response.json().get("output_filename")
+            if name:
+                with self.results_lock:
+                    self.download_names.append(name)
+        return response
+
+    def send_download(self, session):
+        with self.results_lock:
+            name = random.choice(self.download_names) if self.download_names else None
+        if name is None:
+            return None  # Nothing generated yet - skipped, not counted
+        response = session.get(
+            f"{self.args.whisper_url}/download/{name}",
+            timeout=self.args.timeout,
+            stream=True,
+        )
+        # Drain the body so the measured latency covers the full transfer
+        for _ in response.iter_content(chunk_size=1024 * 1024):
+            pass
+        return response
+
+    def send_gemini(self, session):
+        with open(self.args.image, "rb") as f:
+            return session.post(
+                f"{self.args.gemini_url}/generate-gemini-caption",
+                files={"file": (self.unique_name(self.args.image), f)},
+                data={"style": "funny", "language": "en"},
+                timeout=self.args.timeout,
+            )
+
+    def run_one(self, endpoint, scheduled_at):
+        sender = getattr(self, f"send_{endpoint}")
+        session = requests.Session()
+        start = time.perf_counter()
+        error = None
+        status = None
+        try:
+            response = sender(session)
+            if response is None:
+                return
+            status = response.status_code
+            if not response.ok:
+                error = f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        finally:
+            session.close()
+        end = time.perf_counter()
+
+        with self.results_lock:
+            self.results.append({
+                "endpoint": endpoint,
+                "latency": end - start,
+                # Time spent waiting for a free client thread (should stay ~0)
+                "queue_delay": start - scheduled_at,
+                "status": status,
+                "error": error,
+            })
+
+# -------------------------
+# Server resource sampling
+# -------------------------
+class ResourceSampler(threading.Thread):
+    def __init__(self, pids, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.samples = {pid: [] for pid in pids}
+        self.procs = {}
+        # root pid -> {pid: Process} for the root and its children, kept across
+        # samples because cpu_percent() needs the same object to measure an interval
+        self.trees = {}
+        for pid in pids:
+            proc = psutil.Process(pid)
+            proc.cpu_percent(None)  # Prime the CPU counter
+            self.procs[pid] = proc
+            self.trees[pid] = {pid: proc}
+
+    def process_tree(self, root_pid):
+        # Include ffmpeg children spawned by app.py, and the request-serving
+        # child process when the Werkzeug reloader is on (debug=True)
+        tree = self.trees[root_pid]
+        try:
+            children = self.procs[root_pid].children(recursive=True)
+        except psutil.Error:
+            children = []
+        alive = {root_pid} | {child.pid for child in children}
+        for child in children:
+            if child.pid not in tree:
+                try:
+                    child.cpu_percent(None)  # First call always returns 0.0
+                except psutil.Error:
+                    continue
+                tree[child.pid] = child
+        for pid in [pid for pid in tree if pid not in alive]:
+            del tree[pid]
+        return list(tree.values())
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            for pid in self.procs:
+                cpu = 0.0
+                rss = 0
+                for p in self.process_tree(pid):
+                    try:
+                        cpu += p.cpu_percent(None)
+                        rss += p.memory_info().rss
+                    except psutil.Error:
+                        pass
+                self.samples[pid].append((cpu, rss))
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+# -------------------------
+# Reporting
+# -------------------------
+def print_report(results, elapsed, sampler):
+    print("\n" + "=" * 78)
+    print("📊 LOAD TEST RESULTS")
+    print("=" * 78)
+    print(f"{'endpoint':<10} {'count':>6} {'errors':>7} {'err%':>6} {'rps':>6} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    print("-" * 78)
+
+    for endpoint in ENDPOINTS + ("all",):
+        rows = results if endpoint == "all" else [r for r in results if r["endpoint"] == endpoint]
+        if not rows:
+            continue
+        latencies = sorted(r["latency"] for r in rows)
+        errors = sum(1 for r in rows if r["error"])
+        print(f"{endpoint:<10} {len(rows):>6} {errors:>7} {100 * errors / len(rows):>5.1f}% "
+              f"{len(rows) / elapsed:>6.2f} "
+              f"{percentile(latencies, 50):>7.2f}s {percentile(latencies, 90):>7.2f}s "
+              f"{percentile(latencies, 99):>7.2f}s {latencies[-1]:>7.2f}s")
+
+    error_kinds = {}
+    for r in results:
+        if r["error"]:
+            key = (r["endpoint"], r["error"])
+            error_kinds[key] = error_kinds.get(key, 0) + 1
+    if error_kinds:
+        print("\n❌ Errors:")
+        for (endpoint, error), count in sorted(error_kinds.items()):
+            print(f"   {endpoint:<10} {error:<25} x{count}")
+
+    queue_delays = sorted(r["queue_delay"] for r in results)
+    if queue_delays and percentile(queue_delays, 99) > 0.1:
+        print(f"\n⚠️  Client-side queueing p99 = {percentile(queue_delays, 99):.2f}s "
+              f"- raise --max-workers, the generator itself is saturated")
+
+    if sampler:
+        print("\n🖥️  Server resources (process + children):")
+        for pid, samples in sampler.samples.items():
+            if not samples:
+                continue
+            cpus = sorted(s[0] for s in samples)
+            rss = [s[1] for s in samples]
+            print(f"   pid {pid}: CPU avg {sum(cpus) / len(cpus):.0f}% / p99 {percentile(cpus, 99):.0f}%, "
+                  f"RSS avg {sum(rss) / len(rss) / (1024 * 1024):.0f} MB / peak {max(rss) / (1024 * 1024):.0f} MB")
+    print("=" * 78 + "\n")
+
+# -------------------------
+# Main
+# -------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the caption backends")
+    parser.add_argument("--whisper-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--gemini-url", default="http://127.0.0.1:5001")
+    parser.add_argument("--video", help="Video uploaded to the Whisper endpoints")
+    parser.add_argument("--image", help="Image/video uploaded to /generate-gemini-caption")
+    parser.add_argument("--download-file", help="Existing file in outputs/ to use for /download")
+    parser.add_argument("--mix", default="captions=3,video=1,download=4,gemini=2",
+                        help="Relative weights per endpoint: captions, video, download, gemini")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Target arrival rate in requests/second (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to keep sending")
+    parser.add_argument("--task", default="translate", choices=["transcribe", "translate"])
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout")
+    parser.add_argument("--max-workers", type=int, default=256, help="Max in-flight requests")
+    parser.add_argument("--server-pid", type=int, action="append", default=[],
+                        help="Backend PID to sample CPU/RSS from (repeatable)")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if ("captions" in mix or "video" in mix) and not args.video:
+        parser.error("--video is required for the captions/video endpoints")
+    if "gemini" in mix and not args.image:
+        parser.error("--image is required for the gemini endpoint")
+    if args.server_pid and psutil is None:
+        parser.error("psutil is required for --server-pid (pip install -r requirements_loadtest.txt)")
+
+    rng = random.Random(args.seed)
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+
+    print("🚀 CAPTION BACKEND LOAD TEST")
+    print("=" * 60)
+    print(f"⚙️  Mix: {mix}")
+    print(f"⏱️  Rate: {args.rate} req/s for {args.duration}s")
+    print("=" * 60)
+
+    test = LoadTest(args)
+    sampler = ResourceSampler(args.server_pid, args.sample_interval) if args.server_pid else None
+    if sampler:
+        sampler.start()
+
+    # Open-loop generator: arrivals follow the schedule regardless of how
+    # slowly the server responds, so saturation shows up as latency growth
+    start = time.perf_counter()
+    next_arrival = start
+    sent = 0
+    with ThreadPoolExecutor(max_workers=args.max_workers) as pool:
+        while next_arrival - start < args.duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint = rng.choices(endpoints, weights=weights)[0]
+            pool.submit(test.run_one, endpoint, next_arrival)
+            sent += 1
+            if sent % 10 == 0:
+                print(f"📤 Sent {sent} requests ({len(test.results)} completed)")
+            next_arrival += rng.expovariate(args.rate)
+        print("⏳ Waiting for in-flight requests...")
+    elapsed = time.perf_counter() - start
+
+    if sampler:
+        sampler.stop()
+    print_report(test.results, elapsed, sampler)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Multi-track Whisper transcription with one shared encoder pass
+Getting original-language and English captions with model.transcribe means two
+full runs, each recomputing the mel spectrogram and the audio encoder. Here the
+audio is read from ffmpeg in windows of up to 30 seconds; each window's mel
+features and encoder output are computed once and every requested track
+(transcribe, translate, forced-language transcribe, ...) runs only its decoder
+against them. As in streaming_transcribe.py, the unfinished tail of a window is
+carried over into the next one, at a point no track has a caption across.
+
+Usage:
+    python multi_track_transcribe.py video.mp4 --model small --extra-language hi
+"""
+
+import argparse
+
+import numpy as np
+import torch
+import whisper
+from whisper.tokenizer import get_tokenizer
+
+from streaming_transcribe import SAMPLE_RATE, TAIL_MARGIN_SECONDS, open_pcm_stream, read_samples
+
+WINDOW_SECONDS = 30
+TIME_PRECISION = 0.02  # Seconds per Whisper timestamp token
+# Same silence filter and temperature fallback as model.transcribe
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+COMPRESSION_RATIO_THRESHOLD = 2.4
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+# Rough share of Whisper time spent in the decoder; used to size dual jobs for admission
+DECODER_SHARE = 0.7
+# Tracks put caption edges at slightly different times around the same pause,
+# so segments ending this many seconds after a candidate cut may still be kept
+CUT_TOLERANCE = 0.5
+
+DEFAULT_TRACKS = [
+    {"name": "original", "task": "transcribe", "language": None},
+    {"name": "english", "task": "translate", "language": None},
+]
+
+# -------------------------
+# Utilities
+# -------------------------
+def tracks_cost_factor(tracks):
+    """Work relative to one model.transcribe run: one encoder pass + one decoder per track"""
+    return 1 + DECODER_SHARE * (len(tracks) - 1)
+
+def tokens_to_segments(tokens, tokenizer, offset, window_seconds):
+    """Split a decoded token list into timed segments using its timestamp tokens"""
+    segments = []
+    start = None
+    text_tokens = []
+
+    def flush(end):
+        text = tokenizer.decode(text_tokens).strip()
+        if text:
+            segments.append({
+                "start": offset + (start or 0.0),
+                "end": offset + min(end, window_seconds),
+                "text": text
+            })
+
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            t = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if start is None or not text_tokens:
+                start = t
+            else:
+                flush(t)
+                start = None
+                text_tokens = []
+        else:
+            text_tokens.append(token)
+
+    if text_tokens:
+        # Cut off at the window edge without a closing timestamp
+        flush(window_seconds)
+    return segments
+
+def decode_with_fallback(model, features, task, language, prompt, fp16):
+    """Greedy decode, retried at higher temperatures on repetition loops or low confidence"""
+    for temperature in TEMPERATURES:
+        options = whisper.DecodingOptions(
+            task=task,
+            language=language,
+            prompt=prompt or None,
+            temperature=temperature,
+            fp16=fp16,
+        )
+        # Encoded features are passed in place of the mel, so decode() skips the encoder
+        result = whisper.decode(model, features, options)[0]
+        needs_fallback = (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or
+                          result.avg_logprob < LOGPROB_THRESHOLD)
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD:
+            needs_fallback = False  # Silence - the caller drops it, no point retrying
+        if not needs_fallback:
+            break
+    return result
+
+def common_cut(track_segments, limit):
+    """
+    Latest point (about limit or earlier) where every track can be split: all
+    segments end by it or start at/after it. Segments ending within
+    CUT_TOLERANCE of a candidate edge are kept and the cut moves to their end,
+    so nothing before the cut is decoded twice and nothing after it is skipped.
+    Returns None if there is no such point.
+    """
+    segments = [s for segs in track_segments for s in segs]
+    for edge in sorted({s["end"] for s in segments if s["end"] <= limit}, reverse=True):
+        cut = max(s["end"] for s in segments if s["end"] <= edge + CUT_TOLERANCE)
+        if all(s["end"] <= cut or s["start"] >= cut - TIME_PRECISION for s in segments):
+            return cut
+    return None
+
+# -------------------------
+# Shared-encoder transcription
+# -------------------------
+def transcribe_tracks(model, media_path, tracks=None, save_audio_path=None, spool_path=None):
+    """
+    Returns {"language": detected, "tracks": {name: [segments]}}.
+    Each track is {"name", "task", "language"}; language None means the detected one.
+    save_audio_path / spool_path are extra outputs of the same ffmpeg read (see open_pcm_stream).
+    """
+    tracks = tracks or DEFAULT_TRACKS
+    window = WINDOW_SECONDS * SAMPLE_RATE
+    fp16 = model.device.type == "cuda"
+    proc = open_pcm_stream(media_path, save_audio_path, spool_path)
+
+    detected = None
+    results = {t["name"]: [] for t in tracks}
+    # Previous text tokens per track, passed on as the decoder prompt
+    prompts = {t["name"]: [] for t in tracks}
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_offset = 0.0   # Media time of buffer[0], in seconds
+    eof = False
+
+    try:
+        while True:
+            if not eof:
+                chunk = read_samples(proc.stdout, window - len(buffer))
+                eof = len(buffer) + len(chunk) < window
+                buffer = np.concatenate([buffer, chunk])
+            if len(buffer) == 0:
+                break
+            buffer_seconds = len(buffer) / SAMPLE_RATE
+
+            # Mel + encoder once per window, shared by every track below
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(buffer), model.dims.n_mels)
+            with torch.no_grad():
+                features = model.embed_audio(mel.unsqueeze(0).to(model.device))
+
+            if detected is None:
+                _, probs = model.detect_language(features)
+                detected = max(probs[0], key=probs[0].get)
+
+            window_segments = {}
+            tokenizers = {}
+            for track in tracks:
+                name = track["name"]
+                language = track["language"] or detected
+                tokenizers[name] = get_tokenizer(
+                    model.is_multilingual,
+                    num_languages=model.num_languages,
+                    language=language,
+                    task=track["task"],
+                )
+                result = decode_with_fallback(model, features, track["task"], language, prompts[name], fp16)
+                if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                    window_segments[name] = []
+                    continue
+                window_segments[name] = tokens_to_segments(result.tokens, tokenizers[name], 0.0, buffer_seconds)
+                if result.temperature > 0.5:
+                    prompts[name] = []  # Same as model.transcribe: don't condition on a shaky decode
+
+            # Keep the tail after the last point every track agrees is a boundary for the next window
+            cut = None if eof else common_cut(window_segments.values(), buffer_seconds - TAIL_MARGIN_SECONDS)
+            if cut is None:
+                # End of media, or nothing ended early enough (one long utterance) - take it all
+                cut = buffer_seconds
+
+            for name, segments in window_segments.items():
+                for seg in segments:
+                    if seg["end"] > cut:
+                        continue  # Re-decoded with the next window
+                    results[name].append(dict(seg, start=buffer_offset + seg["start"],
+                                              end=buffer_offset + seg["end"]))
+                    text_tokens = tokenizers[name].encode(" " + seg["text"])
+                    prompts[name] = (prompts[name] + text_tokens)[-(model.dims.n_text_ctx // 2 - 1):]
+
+            if eof:
+                break
+
+            consumed_samples = min(len(buffer), max(1, int(cut * SAMPLE_RATE)))
+            buffer = buffer[consumed_samples:].copy()
+            buffer_offset += consumed_samples / SAMPLE_RATE
+
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode("utf-8", errors="replace")
+        if proc.wait() != 0:
+            raise Exception(f"FFmpeg error: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    return {"language": detected or "unknown", "tracks": results}
+
+# -------------------------
+# Command line test
+# -------------------------
+if __name__ == "__main__":
+    import time
+    from test_whisper_direct import write_srt
+
+    parser = argparse.ArgumentParser(description="Transcribe + translate with one encoder pass")
+    parser.add_argument("media")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--extra-language", action="append", default=[],
+                        help="Also transcribe forced to this language code (repeatable)")
+    args = parser.parse_args()
+
+    tracks = DEFAULT_TRACKS + [
+        {"name": f"forced_{code}", "task": "transcribe", "language": code}
+        for code in args.extra_language
+    ]
+
+    print(f"🤖 Loading Whisper model ({args.model})...")
+    model = whisper.load_model(args.model)
+
+    start = time.time()
+    result = transcribe_tracks(model, args.media, tracks)
+    print(f"🌍 Detected language: {result['language']}")
+    for name, segments in result["tracks"].items():
+        print("\n" + "=" * 50)
+        print(f"📋 TRACK: {name} ({len(segments)} segments)")
+        print("=" * 50)
+        print(write_srt(segments))
+    print(f"✅ {len(tracks)} tracks in {time.time() - start:.1f}s")
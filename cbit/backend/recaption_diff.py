@@ -0,0 +1,64 @@
+# -------------------------
+# Audio diff + segment splicing for /recaption
+# -------------------------
+# Pure functions (no Whisper/Flask imports) so they can be tested on their own.
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Block size and tolerance used when diffing old vs. new audio in /recaption
+DIFF_BLOCK_SECONDS = 0.5
+DIFF_TOLERANCE = 0.05
+
+
+def changed_region(old_audio, new_audio):
+    """
+    Find the edited part of new_audio relative to old_audio.
+    Compares fixed blocks from the front and (end-aligned) from the back, so a
+    single trim/insert/replace keeps everything before and after it.
+    Returns (prefix_end, old_suffix_start, new_suffix_start) in seconds.
+    """
+    block = int(DIFF_BLOCK_SECONDS * SAMPLE_RATE)
+
+    def same(a, b):
+        # Lossy re-encodes never match bit for bit, so compare the RMS of the difference
+        diff = np.sqrt(np.mean((a - b) ** 2))
+        level = np.sqrt(np.mean(a ** 2))
+        return diff <= DIFF_TOLERANCE * level + 1e-3
+
+    shortest = min(len(old_audio), len(new_audio))
+    prefix = 0
+    while prefix + block <= shortest and same(old_audio[prefix:prefix + block], new_audio[prefix:prefix + block]):
+        prefix += block
+    if (len(old_audio) == len(new_audio) and 0 < shortest - prefix < block and
+            same(old_audio[prefix:], new_audio[prefix:])):
+        # Trailing partial block of an unchanged re-upload
+        prefix = shortest
+
+    suffix = 0
+    while (suffix + block <= shortest - prefix and
+           same(old_audio[len(old_audio) - suffix - block:len(old_audio) - suffix],
+                new_audio[len(new_audio) - suffix - block:len(new_audio) - suffix])):
+        suffix += block
+
+    return (prefix / SAMPLE_RATE,
+            (len(old_audio) - suffix) / SAMPLE_RATE,
+            (len(new_audio) - suffix) / SAMPLE_RATE)
+
+def splice_segments(old_segments, prefix_end, old_suffix_start, new_suffix_start, new_duration):
+    """
+    Split old segments into the parts kept before/after an edit and work out which
+    range of the new audio has to be re-transcribed.
+    Returns (kept_before, kept_after, lo, hi) where kept_after is already shifted
+    onto the new timeline.
+    """
+    delta = new_suffix_start - old_suffix_start
+    kept_before = [s for s in old_segments if s["end"] <= prefix_end]
+    kept_after = [
+        dict(s, start=s["start"] + delta, end=s["end"] + delta)
+        for s in old_segments
+        if s["start"] >= old_suffix_start
+    ]
+    lo = kept_before[-1]["end"] if kept_before else 0.0
+    hi = kept_after[0]["start"] if kept_after else new_duration
+    return kept_before, kept_after, lo, max(lo, hi)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Speculative decoding for Whisper
+A small draft model (tiny/base) proposes a few tokens with cheap incremental
+steps, and the main model checks all of them in one forward pass. Tokens are
+kept while they equal the main model's own greedy choice (after Whisper's
+logit filters), and the first mismatch is replaced by the main model's token,
+so the transcript is the same as plain greedy decoding with the main model.
+
+Both decoders keep a key/value cache, so a verify pass only feeds the new
+tokens. Whisper's own cache (install_kv_cache_hooks) can't do that: its mask
+and SDPA call assume queries start at position 0, and its forward hooks live
+on the shared model modules. DecoderCache runs the decoder blocks itself with
+a per-request cache and a causal mask offset by the cached length.
+
+SpeculativeWhisper wraps a loaded model and can be used anywhere the model is:
+whisper.transcribe() calls model.decode() per 30-second window, and that is
+the only call it overrides. Non-greedy decodes (temperature fallback, beam
+search) go to the regular decoder.
+
+Usage:
+    python speculative_decoding.py video.mp4 --model small --draft-model tiny
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+import whisper
+from whisper.decoding import DecodingOptions, DecodingResult, DecodingTask
+from whisper.utils import compression_ratio
+
+DRAFT_TOKENS = 4  # Tokens proposed by the draft model per verification pass
+
+
+def attention(attn, x, k, v, mask=None):
+    """Whisper's MultiHeadAttention (non-SDPA path) with precomputed keys/values"""
+    n_state = x.shape[-1]
+    scale = (n_state // attn.n_head) ** -0.25
+    q = attn.query(x)
+    q = q.view(*q.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    v = v.view(*v.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    qk = (q * scale) @ (k * scale).transpose(-1, -2)
+    if mask is not None:
+        qk = qk + mask
+    w = F.softmax(qk.float(), dim=-1).to(q.dtype)
+    return attn.out((w @ v).permute(0, 2, 1, 3).flatten(start_dim=2))
+
+
+class DecoderCache:
+    """Key/value cache of one decoder over one audio window, owned by one request"""
+
+    def __init__(self, decoder, audio_features):
+        self.decoder = decoder
+        self.xa = audio_features
+        self.tokens = []
+        self.self_kv = [None] * len(decoder.blocks)
+        # Cross-attention keys/values only depend on the audio
+        self.cross_kv = [(block.cross_attn.key(audio_features), block.cross_attn.value(audio_features))
+                         for block in decoder.blocks]
+
+    def logits(self, tokens, first=None):
+        """
+        Logits at positions first..len(tokens)-1 (default: the last one). Only
+        tokens past the longest cached prefix are fed; a cached tail that no
+        longer matches (rejected draft tokens) is dropped first.
+        """
+        if first is None:
+            first = len(tokens) - 1
+        common = 0
+        limit = min(len(self.tokens), first)
+        while common < limit and self.tokens[common] == tokens[common]:
+            common += 1
+        if common < len(self.tokens):
+            self.self_kv = [(k[:, :common], v[:, :common]) for k, v in self.self_kv]
+            del self.tokens[common:]
+
+        new = tokens[common:]
+        logits = self._forward(new, offset=common)
+        self.tokens.extend(new)
+        return logits[:, first - common:]
+
+    def _forward(self, tokens, offset):
+        decoder = self.decoder
+        n = len(tokens)
+        x = torch.tensor([tokens], device=self.xa.device)
+        x = decoder.token_embedding(x) + decoder.positional_embedding[offset:offset + n]
+        x = x.to(self.xa.dtype)
+        # New position offset + i sees every cached key and the new keys up to itself
+        mask = torch.full((n, offset + n), float("-inf"), device=x.device).triu_(offset + 1)
+
+        for i, block in enumerate(decoder.blocks):
+            h = block.attn_ln(x)
+            k, v = block.attn.key(h), block.attn.value(h)
+            if self.self_kv[i] is not None:
+                k = torch.cat([self.self_kv[i][0], k], dim=1)
+                v = torch.cat([self.self_kv[i][1], v], dim=1)
+            self.self_kv[i] = (k, v)
+            x = x + attention(block.attn, h, k, v, mask)
+            x = x + attention(block.cross_attn, block.cross_attn_ln(x), *self.cross_kv[i])
+            x = x + block.mlp(block.mlp_ln(x))
+
+        x = decoder.ln(x)
+        return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+
+class SpeculativeWhisper:
+    """
+    Stand-in for a Whisper model whose greedy decoding is speculative. All of
+    its decoding state is per call and no hooks are installed, but whisper's
+    own decode/transcribe (install_kv_cache_hooks) must not run on the same
+    model instances at the same time.
+    """
+
+    def __init__(self, model, draft_model, draft_tokens=DRAFT_TOKENS):
+        if (model.dims.n_mels != draft_model.dims.n_mels or
+                model.dims.n_vocab != draft_model.dims.n_vocab):
+            raise ValueError("Draft model must share the main model's mel bins and vocabulary")
+        self.model = model
+        self.draft = draft_model
+        self.draft_tokens = draft_tokens
+        self.stats = {
+            "windows": 0,
+            "verify_passes": 0,
+            "draft_tokens": 0,
+            "accepted_tokens": 0,
+            "generated_tokens": 0,
+            # Wall time of the speculative decode loops, and of one timed plain
+            # cached greedy step per window as the reference for the speedup
+            "draft_seconds": 0.0,
+            "verify_seconds": 0.0,
+            "greedy_step_seconds": 0.0,
+            "greedy_steps": 0,
+        }
+
+    def __getattr__(self, name):
+        # Everything else (dims, device, detect_language, ...) comes from the main model
+        return getattr(self.model, name)
+
+    def transcribe(self, audio, **kwargs):
+        return whisper.transcribe(self, audio, **kwargs)
+
+    def summary(self):
+        stats = dict(self.stats)
+        greedy_steps = stats.pop("greedy_steps")
+        step = stats.pop("greedy_step_seconds") / max(1, greedy_steps)
+        decode_seconds = stats["draft_seconds"] + stats["verify_seconds"]
+        stats["acceptance_rate"] = round(stats["accepted_tokens"] / max(1, stats["draft_tokens"]), 3)
+        # Not a speedup on its own: a verify pass costs more than one greedy step
+        stats["tokens_per_verify_pass"] = round(stats["generated_tokens"] / max(1, stats["verify_passes"]), 2)
+        stats["decode_seconds"] = round(decode_seconds, 3)
+        stats["draft_seconds"] = round(stats["draft_seconds"], 3)
+        stats["verify_seconds"] = round(stats["verify_seconds"], 3)
+        stats["greedy_step_seconds"] = round(step, 4)
+        # Plain greedy would need one main-model step per generated token
+        stats["estimated_speedup"] = (
+            round(stats["generated_tokens"] * step / decode_seconds, 2) if greedy_steps and decode_seconds else None)
+        return stats
+
+    # -------------------------
+    # model.decode() replacement
+    # -------------------------
+    @torch.no_grad()
+    def decode(self, mel, options=DecodingOptions()):
+        greedy = options.temperature == 0 and options.beam_size is None and options.task != "lang_id"
+        if not greedy:
+            return whisper.decoding.decode(self.model, mel, options)
+
+        single = mel.ndim == 2
+        if single:
+            mel = mel.unsqueeze(0)
+        results = [self._decode_one(mel[i:i + 1], options) for i in range(mel.shape[0])]
+        return results[0] if single else results
+
+    def _decode_one(self, mel, options):
+        task = DecodingTask(self.model, options)
+        tokenizer = task.tokenizer
+        eot = tokenizer.eot
+
+        audio_features = task._get_audio_features(mel)
+        draft_features = self.draft.embed_audio(mel.half() if options.fp16 else mel)
+        tokens = torch.tensor([task.initial_tokens]).to(audio_features.device)
+        languages, _ = task._detect_language(audio_features, tokens)
+
+        seq = tokens[0].tolist()
+        sum_logprobs = torch.zeros(1, device=audio_features.device)
+        no_speech_prob = float("nan")
+        first_pass = True
+        main_cache = DecoderCache(self.model.decoder, audio_features)
+        draft_cache = DecoderCache(self.draft.decoder, draft_features)
+
+        def filtered(logits, context):
+            for logit_filter in task.logit_filters:
+                logit_filter.apply(logits, torch.tensor([context], device=logits.device))
+            return logits
+
+        while len(seq) - task.sample_begin < task.sample_len and len(seq) <= task.n_ctx:
+            generated = len(seq) - task.sample_begin
+            budget = min(self.draft_tokens, task.sample_len - generated, task.n_ctx - len(seq))
+
+            # 1. Draft: cheap incremental proposals
+            started = time.perf_counter()
+            proposal = []
+            for _ in range(budget):
+                logits = filtered(draft_cache.logits(seq + proposal)[:, -1], seq + proposal)
+                proposal.append(logits.argmax(dim=-1).item())
+                if proposal[-1] == eot:
+                    break
+
+            # 2. Verify: one cached main-model pass over the new tokens plus every proposed one
+            drafted = time.perf_counter()
+            self.stats["draft_seconds"] += drafted - started
+            base = len(seq) - 1
+            first = task.sot_index if first_pass else base
+            logits = main_cache.logits(seq + proposal, first=first)
+            self.stats["verify_passes"] += 1
+            self.stats["draft_tokens"] += len(proposal)
+            if first_pass and tokenizer.no_speech is not None:
+                probs_at_sot = logits[:, task.sot_index - first].float().softmax(dim=-1)
+                no_speech_prob = probs_at_sot[0, tokenizer.no_speech].item()
+            first_pass = False
+
+            # 3. Accept matching tokens; the first mismatch takes the main model's token
+            for j in range(len(proposal) + 1):
+                row = filtered(logits[:, base + j - first].clone(), seq)
+                token = row.argmax(dim=-1)
+                sum_logprobs += F.log_softmax(row.float(), dim=-1)[0, token]
+                token = token.item()
+                seq.append(token)
+                self.stats["generated_tokens"] += 1
+
+                matched = j < len(proposal) and token == proposal[j]
+                if matched:
+                    self.stats["accepted_tokens"] += 1
+                if (not matched or token == eot or
+                        len(seq) - task.sample_begin >= task.sample_len or len(seq) > task.n_ctx):
+                    break
+
+            self.stats["verify_seconds"] += time.perf_counter() - drafted
+            if seq[-1] == eot:
+                break
+
+        # Reference cost: one plain cached greedy step at this window's context length
+        if len(main_cache.tokens) < task.n_ctx:
+            started = time.perf_counter()
+            main_cache.logits(main_cache.tokens + [eot])
+            self.stats["greedy_step_seconds"] += time.perf_counter() - started
+            self.stats["greedy_steps"] += 1
+
+        self.stats["windows"] += 1
+        out = seq[task.sample_begin:]
+        if eot in out:
+            out = out[:out.index(eot)]
+        text = tokenizer.decode(out).strip()
+        return DecodingResult(
+            audio_features=audio_features[0],
+            language=languages[0],
+            tokens=out,
+            text=text,
+            avg_logprob=sum_logprobs.item() / (len(out) + 1),
+            no_speech_prob=no_speech_prob,
+            temperature=options.temperature,
+            compression_ratio=compression_ratio(text),
+        )
+
+# -------------------------
+# Command line benchmark
+# -------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare plain vs. speculative Whisper decoding")
+    parser.add_argument("media")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--draft-model", default="tiny")
+    parser.add_argument("--draft-tokens", type=int, default=DRAFT_TOKENS)
+    parser.add_argument("--task", default="translate", choices=["transcribe", "translate"])
+    args = parser.parse_args()
+
+    print(f"🤖 Loading Whisper models ({args.model} + draft {args.draft_model})...")
+    model = whisper.load_model(args.model)
+    draft = whisper.load_model(args.draft_model, device=model.device)
+    audio = whisper.load_audio(args.media)
+
+    start = time.time()
+    plain = model.transcribe(audio, task=args.task)
+    plain_time = time.time() - start
+
+    speculative = SpeculativeWhisper(model, draft, draft_tokens=args.draft_tokens)
+    start = time.time()
+    fast = speculative.transcribe(audio, task=args.task)
+    fast_time = time.time() - start
+
+    print("\n" + "=" * 60)
+    print("📊 SPECULATIVE DECODING RESULTS")
+    print("=" * 60)
+    print(f"   Plain:       {plain_time:.1f}s")
+    print(f"   Speculative: {fast_time:.1f}s  (speedup {plain_time / max(fast_time, 1e-9):.2f}x)")
+    for key, value in speculative.summary().items():
+        print(f"   {key}: {value}")
+    same = [s["text"] for s in plain["segments"]] == [s["text"] for s in fast["segments"]]
+    print(f"   Identical transcript: {'✅ yes' if same else '❌ no'}")
+    print("=" * 60)
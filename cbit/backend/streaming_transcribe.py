@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory Whisper transcription
+model.transcribe(path) decodes the whole file into one float32 array and builds
+the mel spectrogram for all of it before decoding starts. For multi-hour media
+that is hundreds of MB per request. This module instead reads 16 kHz PCM from
+an ffmpeg pipe one window at a time, keeps only the un-finished tail of the
+previous window, and yields segments as soon as they are final, so peak memory
+depends on the window size and not on the length of the media.
+
+Usage:
+    python streaming_transcribe.py long_video.mp4 --model small --task translate
+"""
+
+import argparse
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30       # Whisper's own input length
+# Segments ending this close to the window edge may be cut off mid-sentence,
+# so they are re-decoded together with the next window instead
+TAIL_MARGIN_SECONDS = 5
+PROMPT_SEGMENTS = 3       # How many finished segments to pass on as the prompt
+
+# -------------------------
+# Utilities
+# -------------------------
+def spool_output_args(spool_path):
+    """
+    Extra ffmpeg output that stream-copies the input's video and audio packets
+    into a Matroska spool file. The spool can be muxed with subtitles later
+    without reading the original input again.
+    """
+    return ["-map", "0:v?", "-map", "0:a?", "-c", "copy", "-f", "matroska", spool_path]
+
+def open_pcm_stream(media_path, save_audio_path=None, spool_path=None):
+    """
+    Start ffmpeg decoding media_path to 16 kHz mono s16le on stdout.
+    If save_audio_path is given the same decode is also written there (e.g.
+    FLAC for the asset store), and if spool_path is given the video/audio
+    packets are copied there, all without a second pass over the input.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+        "-i", media_path,
+    ]
+    if spool_path:
+        cmd += spool_output_args(spool_path)
+    if save_audio_path:
+        cmd += ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), save_audio_path]
+    cmd += [
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-ac", "1",
+        "pipe:1"
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def read_samples(stream, count):
+    """Read up to count samples as float32; returns fewer only at end of stream"""
+    data = stream.read(count * 2)
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+# -------------------------
+# Streaming transcription
+# -------------------------
+def transcribe_stream(model, media_path, task="translate", language=None,
+                      save_audio_path=None, window_seconds=WINDOW_SECONDS, info=None,
+                      spool_path=None):
+    """
+    Generator yielding {"start", "end", "text"} segments in order.
+    The detected language is stored in info["language"] if a dict is passed.
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    margin = TAIL_MARGIN_SECONDS
+    proc = open_pcm_stream(media_path, save_audio_path, spool_path)
+
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_offset = 0.0   # Media time of buffer[0], in seconds
+    prompt = []
+    eof = False
+
+    try:
+        while True:
+            if not eof:
+                chunk = read_samples(proc.stdout, window - len(buffer))
+                eof = len(buffer) + len(chunk) < window
+                buffer = np.concatenate([buffer, chunk])
+            if len(buffer) == 0:
+                break
+
+            result = model.transcribe(
+                buffer,
+                task=task,
+                language=language,
+                initial_prompt=" ".join(prompt) or None,
+            )
+            if language is None:
+                # Lock in the first window's language so later windows don't flip
+                language = result.get("language")
+                if info is not None:
+                    info["language"] = language
+
+            buffer_seconds = len(buffer) / SAMPLE_RATE
+            segments = result["segments"]
+            if eof:
+                final = segments
+            else:
+                final = [s for s in segments if s["end"] <= buffer_seconds - margin]
+                if not final:
+                    # Nothing ended early enough (one long utterance) - take it all
+                    # rather than growing the buffer past one window
+                    final = segments
+
+            for seg in final:
+                text = seg["text"].strip()
+                if not text:
+                    continue
+                prompt = (prompt + [text])[-PROMPT_SEGMENTS:]
+                yield {
+                    "start": buffer_offset + float(seg["start"]),
+                    "end": buffer_offset + min(float(seg["end"]), buffer_seconds),
+                    "text": text
+                }
+
+            if eof:
+                break
+
+            # Keep only the audio after the last finished segment
+            consumed = float(final[-1]["end"]) if final else buffer_seconds
+            consumed_samples = min(len(buffer), max(1, int(consumed * SAMPLE_RATE)))
+            buffer = buffer[consumed_samples:].copy()
+            buffer_offset += consumed_samples / SAMPLE_RATE
+
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode("utf-8", errors="replace")
+        if proc.wait() != 0:
+            raise Exception(f"FFmpeg error: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+def transcribe_streaming(model, media_path, task="translate", language=None, save_audio_path=None,
+                         spool_path=None):
+    """Drop-in for model.transcribe(path) results: {"segments": [...], "language": ...}"""
+    info = {"language": language}
+    segments = list(transcribe_stream(model, media_path, task=task, language=language,
+                                      save_audio_path=save_audio_path, info=info,
+                                      spool_path=spool_path))
+    return {"segments": segments, "language": info["language"] or "unknown"}
+
+# -------------------------
+# Command line test
+# -------------------------
+if __name__ == "__main__":
+    import time
+    import whisper
+
+    parser = argparse.ArgumentParser(description="Transcribe long media with bounded memory")
+    parser.add_argument("media")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--task", default="translate", choices=["transcribe", "translate"])
+    parser.add_argument("--language", default=None)
+    args = parser.parse_args()
+
+    print(f"🤖 Loading Whisper model ({args.model})...")
+    model = whisper.load_model(args.model)
+
+    start = time.time()
+    count = 0
+    for seg in transcribe_stream(model, args.media, task=args.task, language=args.language):
+        count += 1
+        print(f"[{seg['start']:8.2f}s - {seg['end']:8.2f}s] {seg['text']}")
+    elapsed = time.time() - start
+
+    print(f"\n✅ {count} segments in {elapsed:.1f}s")
+    try:
+        import resource
+        # ru_maxrss is KB on Linux
+        print(f"📊 Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    except ImportError:
+        pass  # Not available on Windows
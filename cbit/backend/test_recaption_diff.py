@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the /recaption audio diff and segment splicing
+Usage:
+    python -m pytest test_recaption_diff.py
+"""
+
+import numpy as np
+
+from recaption_diff import SAMPLE_RATE, changed_region, splice_segments
+
+
+def noise(seconds, seed):
+    rng = np.random.default_rng(seed)
+    return (0.1 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+def test_unchanged_reupload_with_partial_last_block():
+    audio = noise(60.31, 0)
+    assert changed_region(audio, audio.copy()) == (60.31, 60.31, 60.31)
+
+def test_short_same_length_edit_in_long_file():
+    old = noise(3600, 1)
+    new = old.copy()
+    new[100 * SAMPLE_RATE:103 * SAMPLE_RATE] = noise(3, 2)
+    prefix_end, old_suffix_start, new_suffix_start = changed_region(old, new)
+    assert prefix_end == 100.0
+    assert old_suffix_start == new_suffix_start == 103.0
+
+def test_edit_in_trailing_partial_block():
+    old = noise(60.31, 3)
+    new = old.copy()
+    new[-1000:] = noise(1000 / SAMPLE_RATE, 4)
+    prefix_end, old_suffix_start, new_suffix_start = changed_region(old, new)
+    assert prefix_end == 60.0
+    assert old_suffix_start == new_suffix_start == 60.31
+
+def test_cut_from_the_middle():
+    old = noise(30, 5)
+    new = np.concatenate([old[:10 * SAMPLE_RATE], old[15 * SAMPLE_RATE:]])
+    assert changed_region(old, new) == (10.0, 15.0, 10.0)
+
+def test_splice_shifts_segments_after_the_edit():
+    segments = [
+        {"start": 0.0, "end": 4.0, "text": "a"},
+        {"start": 4.5, "end": 11.0, "text": "b"},
+        {"start": 16.0, "end": 20.0, "text": "c"},
+    ]
+    kept_before, kept_after, lo, hi = splice_segments(segments, 10.0, 15.0, 10.0, 25.0)
+    assert [s["text"] for s in kept_before] == ["a"]
+    assert kept_after == [{"start": 11.0, "end": 15.0, "text": "c"}]
+    # Re-transcribe from the end of the last kept caption to the start of the next one
+    assert (lo, hi) == (4.0, 11.0)
+
+def test_splice_without_kept_segments_covers_everything():
+    segments = [{"start": 1.0, "end": 9.0, "text": "a"}]
+    assert splice_segments(segments, 0.0, 10.0, 12.0, 12.0) == ([], [], 0.0, 12.0)
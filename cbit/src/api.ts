@@ -39,6 +39,21 @@ interface VideoWithCaptionsResponse {
   message: string
 }
 
+interface ProgressiveCaptionResponse {
+  success: boolean
+  job_id: string
+  status: 'draft' | 'refining' | 'final' | 'failed'
+  captions: string
+  segments: Array<{
+    key: number
+    start: number
+    end: number
+    text: string
+  }>
+  language_detected: string
+  error?: string
+}
+
 interface ContinuousCaption {
   time: string
   text: string
@@ -204,30 +219,7 @@ export async function generateContinuousVideoCaptions(
       throw new Error(data.message || 'Failed to generate captions')
     }
 
-    // Convert segments to continuous captions format
-    const continuousCaptions: Array<ContinuousCaption> = data.segments.map(segment => {
-      const minutes = Math.floor(segment.start / 60)
-      const seconds = Math.floor(segment.start % 60)
-      const time = `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}:00`
-      
-      let text = segment.text
-      
-      // Apply style modifications
-      if (options.style === 'meme') {
-        text = addMemeStyle(text)
-      } else if (options.style === 'aesthetic') {
-        text = addAestheticStyle(text)
-      }
-      
-      // Add translation indicator if needed
-      if (options.inputLanguage !== options.outputLanguage) {
-        text += ` [Translated from ${options.inputLanguage} to ${options.outputLanguage}]`
-      }
-      
-      return { time, text }
-    })
-
-    return continuousCaptions
+    return toContinuousCaptions(data.segments, options)
     
   } catch (error) {
     console.error('Error generating continuous video captions:', error)
@@ -236,6 +228,115 @@ export async function generateContinuousVideoCaptions(
   }
 }
 
+// Generate continuous captions progressively: fast draft first, refined captions when ready
+export async function generateProgressiveContinuousVideoCaptions(
+  file: File,
+  options: { inputLanguage: string; outputLanguage: string; style: string },
+  onUpdate: (captions: Array<ContinuousCaption>, status: 'draft' | 'final') => void
+): Promise<Array<ContinuousCaption>> {
+  const isBackendAvailable = await checkBackendHealth()
+  
+  if (!isBackendAvailable) {
+    // Fallback to mock API
+    const captions = await generateMockContinuousVideoCaptions(file, options)
+    onUpdate(captions, 'final')
+    return captions
+  }
+
+  let draft: ProgressiveCaptionResponse
+  try {
+    const formData = new FormData()
+    formData.append('video', file)
+    formData.append('task', options.inputLanguage !== options.outputLanguage ? 'translate' : 'transcribe')
+
+    const response = await fetch(`${API_BASE_URL}/generate-captions-progressive`, {
+      method: 'POST',
+      body: formData,
+    })
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`)
+    }
+
+    draft = await response.json()
+    
+  } catch (error) {
+    console.error('Error generating progressive video captions:', error)
+    // No draft yet - fall back to the regular (non-progressive) request
+    const captions = await generateContinuousVideoCaptions(file, options)
+    onUpdate(captions, 'final')
+    return captions
+  }
+
+  console.log('⚡ FRONTEND: Draft captions received:', draft.segments?.length || 0, 'segments')
+  const draftCaptions = toContinuousCaptions(draft.segments, options)
+  onUpdate(draftCaptions, 'draft')
+
+  // Poll until the refined captions replace the draft; on any failure keep the draft
+  const deadline = Date.now() + PROGRESSIVE_POLL_TIMEOUT_MS
+  while (Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, PROGRESSIVE_POLL_MS))
+    let job: ProgressiveCaptionResponse
+    try {
+      const poll = await fetch(`${API_BASE_URL}/progressive/${draft.job_id}`)
+      if (!poll.ok) {
+        // 404 once the backend has expired the job
+        console.warn(`Progressive job poll failed (status ${poll.status}), keeping draft captions`)
+        break
+      }
+      job = await poll.json()
+    } catch (error) {
+      console.warn('Progressive job poll error, retrying:', error)
+      continue
+    }
+    if (job.status === 'final') {
+      console.log('✅ FRONTEND: Refined captions received:', job.segments.length, 'segments')
+      const finalCaptions = toContinuousCaptions(job.segments, options)
+      onUpdate(finalCaptions, 'final')
+      return finalCaptions
+    }
+    if (job.status === 'failed') {
+      console.warn('Refinement failed, keeping draft captions:', job.error)
+      break
+    }
+  }
+
+  onUpdate(draftCaptions, 'final')
+  return draftCaptions
+}
+
+const PROGRESSIVE_POLL_MS = 2000
+// Same as the backend's PROGRESSIVE_JOB_TTL; the job is gone after that anyway
+const PROGRESSIVE_POLL_TIMEOUT_MS = 60 * 60 * 1000
+
+// Convert backend segments to continuous captions format
+function toContinuousCaptions(
+  segments: Array<{ start: number; end: number; text: string }>,
+  options: { inputLanguage: string; outputLanguage: string; style: string }
+): Array<ContinuousCaption> {
+  return segments.map(segment => {
+    const minutes = Math.floor(segment.start / 60)
+    const seconds = Math.floor(segment.start % 60)
+    const time = `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}:00`
+    
+    let text = segment.text
+    
+    // Apply style modifications
+    if (options.style === 'meme') {
+      text = addMemeStyle(text)
+    } else if (options.style === 'aesthetic') {
+      text = addAestheticStyle(text)
+    }
+    
+    // Add translation indicator if needed
+    if (options.inputLanguage !== options.outputLanguage) {
+      text += ` [Translated from ${options.inputLanguage} to ${options.outputLanguage}]`
+    }
+    
+    return { time, text }
+  })
+}
+
 // Generate video with embedded captions
 export async function generateVideoWithCaptions(file: File, options: CaptionOptions): Promise<{
   downloadUrl: string
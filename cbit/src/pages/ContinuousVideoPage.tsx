@@ -1,5 +1,5 @@
 import React, { useRef, useState } from 'react'
-import { generateContinuousVideoCaptions, generateVideoWithCaptions, downloadSRTFile, checkBackendHealth } from '../api'
+import { generateProgressiveContinuousVideoCaptions, generateVideoWithCaptions, downloadSRTFile, checkBackendHealth } from '../api'
 
 export type LanguageOptions = {
   inputLanguage: string
@@ -46,9 +46,13 @@ const ContinuousVideoPage: React.FC = () => {
     setStatus('Processing video and generating continuous captions...')
     
     try {
-      const generatedCaptions = await generateContinuousVideoCaptions(videoFile, options)
-      setCaptions(generatedCaptions)
-      setStatus('Continuous captions generated successfully!')
+      // Draft captions show up within seconds; the refined ones replace them when ready
+      await generateProgressiveContinuousVideoCaptions(videoFile, options, (generatedCaptions, stage) => {
+        setCaptions(generatedCaptions)
+        setStatus(stage === 'draft'
+          ? 'Draft captions ready — refining with the full model...'
+          : 'Continuous captions generated successfully!')
+      })
     } catch (err) {
       setStatus('Failed to generate continuous captions')
     } finally {